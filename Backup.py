@@ -1,9 +1,13 @@
+import io
 import os
+import queue
 import re
+import threading
 import traceback
 import tempfile
 import shutil
 import zipfile
+from contextlib import contextmanager
 from datetime import datetime
 
 from PyQt6.QtWidgets import QWidget, QMessageBox, QFileDialog
@@ -11,10 +15,32 @@ from PyQt6.QtCore import QSettings, QThread, pyqtSignal, QObject
 from PyQt6.QtGui import QCloseEvent
 
 from Backup_ui import Backup_ui
+from BackupEncoder import build_row_encoder
 from pymysql.constants import FIELD_TYPE
 from pymysql import converters as pymysql_converters
 
 
+# Rows pulled per fetchmany() from the unbuffered cursor (QSettings backup_fetch_rows)
+BACKUP_FETCH_ROWS = 1000
+# Connections used by the parallel table dump (QSettings backup_parallel); 1 = sequential
+BACKUP_PARALLEL = 1
+BACKUP_PARALLEL_MAX = 8
+# Extended INSERT: rows packed per statement up to this many bytes (QSettings backup_insert_bytes);
+# 0 writes one INSERT per row. Kept well under the server's default max_allowed_packet.
+# Restore redoes a batch row by row on a Navicat-tolerant error, so one bad row still loses one row.
+BACKUP_INSERT_BYTES = 1000000
+# ZIP compression (QSettings backup_compression / backup_compresslevel)
+BACKUP_COMPRESSION_METHODS = {
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+    "stored": zipfile.ZIP_STORED,
+}
+BACKUP_COMPRESSION = "deflate"
+BACKUP_COMPRESSLEVEL = 6
+# Parallel dumps spool each table in memory up to this size before spilling to a temp file
+BACKUP_SPOOL_BYTES = 32 * 1024 * 1024
+
 class Backup(QWidget, Backup_ui):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -34,6 +60,19 @@ class Backup(QWidget, Backup_ui):
                 self.txt_dest.setText(default_dir)
         except Exception:
             traceback.print_exc()
+        try:
+            self.spin_parallel.setRange(1, BACKUP_PARALLEL_MAX)
+            self.spin_parallel.setValue(int(self.settings.value("backup_parallel", BACKUP_PARALLEL)))
+        except Exception:
+            traceback.print_exc()
+        try:
+            for method in BACKUP_COMPRESSION_METHODS:
+                self.cmb_compression.addItem(method, method)
+            idx = self.cmb_compression.findData(str(self.settings.value("backup_compression", BACKUP_COMPRESSION)))
+            self.cmb_compression.setCurrentIndex(max(0, idx))
+            self.spin_compresslevel.setValue(int(self.settings.value("backup_compresslevel", BACKUP_COMPRESSLEVEL)))
+        except Exception:
+            traceback.print_exc()
         self._thread = None
         self._worker = None
 
@@ -88,6 +127,9 @@ class Backup(QWidget, Backup_ui):
                 traceback.print_exc()
             self.btn_start.setEnabled(False)
             self.btn_browse.setEnabled(False)
+            self.spin_parallel.setEnabled(False)
+            self.cmb_compression.setEnabled(False)
+            self.spin_compresslevel.setEnabled(False)
             self.btn_stop.setEnabled(True)
             self.txt_log.clear()
             self.progress.setValue(0)
@@ -101,7 +143,30 @@ class Backup(QWidget, Backup_ui):
             zip_name = f"backup_{his_name}_{stamp}.zip"
             zip_path = os.path.join(dest_dir, zip_name)
             self._thread = QThread(self)
-            self._worker = BackupWorker(cfg, zip_path)
+            try:
+                fetch_rows = int(self.settings.value("backup_fetch_rows", BACKUP_FETCH_ROWS))
+            except (TypeError, ValueError):
+                fetch_rows = BACKUP_FETCH_ROWS
+            try:
+                insert_bytes = int(self.settings.value("backup_insert_bytes", BACKUP_INSERT_BYTES))
+            except (TypeError, ValueError):
+                insert_bytes = BACKUP_INSERT_BYTES
+            parallel = int(self.spin_parallel.value())
+            try:
+                self.settings.setValue("backup_parallel", parallel)
+            except Exception:
+                traceback.print_exc()
+            compression = str(self.cmb_compression.currentData() or BACKUP_COMPRESSION)
+            compresslevel = int(self.spin_compresslevel.value())
+            try:
+                self.settings.setValue("backup_compression", compression)
+                self.settings.setValue("backup_compresslevel", compresslevel)
+            except Exception:
+                traceback.print_exc()
+            self._worker = BackupWorker(
+                cfg, zip_path, fetch_rows=fetch_rows, parallel=parallel, insert_bytes=insert_bytes,
+                compression=compression, compresslevel=compresslevel,
+            )
             self._worker.moveToThread(self._thread)
             self._thread.started.connect(self._worker.run)
             self._worker.progress_changed.connect(self.on_progress)
@@ -170,6 +235,9 @@ class Backup(QWidget, Backup_ui):
         try:
             self.btn_start.setEnabled(True)
             self.btn_browse.setEnabled(True)
+            self.spin_parallel.setEnabled(True)
+            self.cmb_compression.setEnabled(True)
+            self.spin_compresslevel.setEnabled(True)
             self.btn_stop.setEnabled(False)
         except Exception:
             traceback.print_exc()
@@ -199,12 +267,27 @@ class BackupWorker(QObject):
     finished_error = pyqtSignal(str)
     ask_ui_reset = pyqtSignal()
 
-    def __init__(self, db_config: dict, zip_path: str):
+    def __init__(self, db_config: dict, zip_path: str, fetch_rows: int = BACKUP_FETCH_ROWS, parallel: int = BACKUP_PARALLEL,
+                 insert_bytes: int = BACKUP_INSERT_BYTES, compression: str = BACKUP_COMPRESSION,
+                 compresslevel: int = BACKUP_COMPRESSLEVEL):
         super().__init__()
         self._db_config = dict(db_config or {})
         self._zip_path = zip_path
+        # Memory held per table is bounded by this many rows, not by table size
+        self._fetch_rows = max(1, int(fetch_rows or BACKUP_FETCH_ROWS))
+        self._parallel = max(1, min(BACKUP_PARALLEL_MAX, int(parallel or 1)))
+        self._insert_bytes = max(0, int(insert_bytes or 0))
+        self._compression = BACKUP_COMPRESSION_METHODS.get(str(compression or "").lower(), zipfile.ZIP_DEFLATED)
+        self._compresslevel = int(compresslevel)
+        if self._compression == zipfile.ZIP_BZIP2:
+            self._compresslevel = max(1, min(9, self._compresslevel))
+        self._zf = None
+        self._zip_lock = threading.Lock()
         self._stop = False
         self._conn = None  # Store connection for cleanup
+        self._conv = None
+        self._dump_conns = []  # parallel dump connections, closed on stop
+        self._lock = threading.Lock()
 
     def request_stop(self):
         self._stop = True
@@ -215,36 +298,223 @@ class BackupWorker(QObject):
             except Exception:
                 pass
             self._conn = None
+        self._close_dump_conns()
 
-    def _escape(self, val, max_length=None):
-        if val is None:
-            return "''"  # Navicat uses empty string for null
-        if isinstance(val, (int, float)):
-            return f"'{val}'"  # Navicat quotes all numbers
-        if isinstance(val, (bytes, bytearray)):
+    def _close_dump_conns(self):
+        # Closing abandons unread SSCursor rows instead of draining them
+        with self._lock:
+            conns, self._dump_conns = self._dump_conns, []
+        for c in conns:
             try:
-                return "0x" + bytes(val).hex()
-            except Exception:
-                return "''"
+                c.close()
+            except Exception as e:
+                print("close dump connection error:", e)
+
+    def _write_header(self, f):
+        """Navicat-style file header; Restore detects backups by its first line."""
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        f.write("/*\n")
+        f.write("Navicat MySQL Data Transfer\n\n")
+        f.write(f"Source Server         : {self._source_server}\n")
+        f.write(f"Source Server Version : {self._source_version}\n")
+        f.write(f"Source Host           : {self._source_host_line}\n")
+        f.write(f"Source Database       : {self._db_config.get('database') or ''}\n\n")
+        f.write("Target Server Type    : MYSQL\n")
+        f.write(f"Target Server Version : {self._source_version}\n")
+        f.write("File Encoding         : 65001\n\n")
+        f.write(f"Date: {now_str}\n")
+        f.write("*/\n\n")
+        f.write("SET FOREIGN_KEY_CHECKS=0;\n\n")
+
+    def _dump_table(self, conn, t: str, f):
+        """Write the structure and rows of table t to the open text stream f."""
+        import pymysql.cursors
+
+        def _as_text(x):
+            if isinstance(x, (bytes, bytearray)):
+                try:
+                    return x.decode('utf-8', 'ignore')
+                except Exception:
+                    return str(x)
+            return str(x)
+
+        with conn.cursor() as cur:
+            cur.execute(f"SHOW CREATE TABLE `{t}`")
+            row = cur.fetchone()
+            create_sql = row[1] if row and len(row) > 1 else None
+            if isinstance(create_sql, (bytes, bytearray)):
+                try:
+                    create_sql = create_sql.decode('utf-8', 'ignore')
+                except Exception:
+                    create_sql = None
+            if create_sql:
+                f.write("-- ----------------------------\n")
+                f.write(f"-- Table structure for {t}\n")
+                f.write("-- ----------------------------\n")
+                f.write(f"DROP TABLE IF EXISTS `{t}`;\n")
+                f.write(create_sql + ";\n\n")
+            # Read all columns as raw bytes to avoid type conversions (e.g., DECIMAL)
+            cur.execute(f"SHOW COLUMNS FROM `{t}`")
+            col_rows = cur.fetchall() or []
+            col_names = []
+            col_types = []
+            for r in col_rows:
+                try:
+                    col_names.append(_as_text(r[0]))
+                    col_types.append(_as_text(r[1]) if len(r) > 1 else "")
+                except Exception:
+                    traceback.print_exc()
+            # Column kinds are resolved once per table, not per cell
+            encode_row = build_row_encoder(col_types)
+            select_expr = ", ".join([f"CAST(`{c}` AS BINARY) AS `{c}`" for c in col_names]) if col_names else "*"
+        # Unbuffered cursor: rows are written as the server sends them
+        with conn.cursor(pymysql.cursors.SSCursor) as cur:
+            cur.execute(f"SELECT {select_expr} FROM `{t}`")
+            wrote_header = False
+            insert_prefix = f"INSERT INTO `{t}` VALUES "
+            limit = self._insert_bytes
+            pending = []
+            pending_bytes = 0
+            while True:
+                if self._stop:
+                    break
+                rows = cur.fetchmany(self._fetch_rows)
+                if not rows:
+                    break
+                if not wrote_header:
+                    f.write("-- ----------------------------\n")
+                    f.write(f"-- Records of {t}\n")
+                    f.write("-- ----------------------------\n")
+                    wrote_header = True
+                for r in rows:
+                    values = encode_row(r)
+                    if limit <= 0:
+                        f.write(f"{insert_prefix}{values};\n")
+                        continue
+                    size = len(values) if values.isascii() else len(values.encode("utf-8"))
+                    # One statement per line: Restore splits statements at a trailing ';'
+                    if pending and pending_bytes + size + 1 > limit:
+                        f.write(insert_prefix + ",".join(pending) + ";\n")
+                        pending = []
+                        pending_bytes = 0
+                    pending.append(values)
+                    pending_bytes += size + 1
+            if pending:
+                f.write(insert_prefix + ",".join(pending) + ";\n")
+
+    @contextmanager
+    def _zip_entry(self, name: str):
+        """Text stream written straight into the ZIP member name (one member at a time)."""
+        with self._zip_lock:
+            with self._zf.open(name, "w", force_zip64=True) as raw:
+                f = io.TextIOWrapper(raw, encoding="utf-8")
+                try:
+                    yield f
+                    f.flush()
+                finally:
+                    f.detach()
+
+    def _zip_spooled(self, name: str, spool) -> None:
+        """Copy a finished spooled member into the ZIP (parallel workers cannot share one open member)."""
+        spool.seek(0)
+        with self._zip_lock:
+            with self._zf.open(name, "w", force_zip64=True) as raw:
+                shutil.copyfileobj(spool, raw, 1024 * 1024)
+
+    def _open_snapshot_connections(self, n: int) -> list:
+        """Open n connections that all read the same consistent InnoDB snapshot.
+
+        A global read lock is held on the main connection while the snapshots
+        start, so every connection sees the same point in time. Without the
+        RELOAD privilege the lock fails and each connection gets its own
+        snapshot (consistent per table only); a warning is logged.
+        """
+        import pymysql
+        locked = False
         try:
-            s = str(val)
-        except Exception:
-            s = repr(val)
-        
-        # Handle string 'None' values - convert to empty string
-        if s == 'None':
-            s = ''
-        
-        # Handle data too long by truncating if max_length is specified
-        if max_length and len(s) > max_length:
-            s = s[:max_length]
-            
-        s = s.replace("\\", "\\\\").replace("'", "\\'")
-        return f"'{s}'"
+            with self._conn.cursor() as cur:
+                cur.execute("FLUSH TABLES WITH READ LOCK")
+            locked = True
+        except Exception as e:
+            traceback.print_exc()
+            self.log_line.emit(f"WARNING: FLUSH TABLES WITH READ LOCK ไม่สำเร็จ ({e}) แต่ละตารางจะสอดคล้องภายในตัวเองเท่านั้น")
+        conns = []
+        try:
+            for _ in range(n):
+                c = pymysql.connect(**self._db_config, conv=self._conv)
+                with self._lock:
+                    self._dump_conns.append(c)
+                conns.append(c)
+                with c.cursor() as cur:
+                    cur.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    cur.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        finally:
+            if locked:
+                try:
+                    with self._conn.cursor() as cur:
+                        cur.execute("UNLOCK TABLES")
+                except Exception:
+                    traceback.print_exc()
+        return conns
+
+    def _dump_tables_parallel(self, tables: list, total_items: int) -> bool:
+        """Dump tables over up to self._parallel connections; returns False on stop or error."""
+        n = min(self._parallel, len(tables))
+        self.log_line.emit(f"สำรองตารางแบบขนาน {n} การเชื่อมต่อ")
+        conns = self._open_snapshot_connections(n)
+        jobs = queue.Queue()
+        for t in tables:
+            jobs.put(t)
+        state = {"done": 0, "error": None}
+
+        def work(conn):
+            while not self._stop:
+                try:
+                    t = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    with tempfile.SpooledTemporaryFile(max_size=BACKUP_SPOOL_BYTES, mode="w+b") as spool:
+                        f = io.TextIOWrapper(spool, encoding="utf-8")
+                        self._write_header(f)
+                        self._dump_table(conn, t, f)
+                        f.flush()
+                        f.detach()
+                        if not self._stop:
+                            self._zip_spooled(f"{t}.sql", spool)
+                except Exception as e:
+                    if not self._stop:
+                        traceback.print_exc()
+                        with self._lock:
+                            if state["error"] is None:
+                                state["error"] = f"{t}: {e}"
+                        self._stop = True
+                        # Siblings stop now rather than after draining their current table
+                        self._close_dump_conns()
+                    return
+                if self._stop:
+                    return
+                with self._lock:
+                    state["done"] += 1
+                    done = state["done"]
+                self.log_line.emit(f"[{done}/{total_items}] สำรองตารางแล้ว: {t}")
+                self.progress_changed.emit(int(done * 100 / total_items))
+
+        threads = [threading.Thread(target=work, args=(c,), name=f"backup-dump-{i}", daemon=True) for i, c in enumerate(conns)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        self._close_dump_conns()
+        if state["error"] is not None:
+            raise RuntimeError(state["error"])
+        return not self._stop
 
     def run(self):
         import pymysql
-        tmp_dir = None
+        import pymysql.cursors
+        part_path = self._zip_path + ".part"
+        completed = False
         try:
             conv = pymysql_converters.conversions.copy()
             try:
@@ -252,6 +522,7 @@ class BackupWorker(QObject):
                 conv[FIELD_TYPE.NEWDECIMAL] = lambda x: x
             except Exception:
                 pass
+            self._conv = conv
             self._conn = pymysql.connect(**self._db_config, conv=conv)
             conn = self._conn
             
@@ -285,8 +556,11 @@ class BackupWorker(QObject):
                             source_version = str(vv)
             except Exception:
                 traceback.print_exc()
+            self._source_server = source_server
+            self._source_host_line = source_host_line
+            self._source_version = source_version
             with conn.cursor() as cur:
-                cur.execute("SELECT table_name FROM information_schema.tables WHERE table_schema=%s AND table_type='BASE TABLE' ORDER BY table_name", (dbname,))
+                cur.execute("SELECT table_name, COALESCE(data_length, 0) + COALESCE(index_length, 0) FROM information_schema.tables WHERE table_schema=%s AND table_type='BASE TABLE' ORDER BY table_name", (dbname,))
                 def _as_text(x):
                     if isinstance(x, (bytes, bytearray)):
                         try:
@@ -294,7 +568,9 @@ class BackupWorker(QObject):
                         except Exception:
                             return str(x)
                     return str(x)
-                tables = [_as_text(r[0]) for r in (cur.fetchall() or [])]
+                table_rows = cur.fetchall() or []
+                tables = [_as_text(r[0]) for r in table_rows]
+                table_sizes = {_as_text(r[0]): int(float(_as_text(r[1] or 0))) for r in table_rows}
                 # Views
                 try:
                     cur.execute("SELECT table_name FROM information_schema.views WHERE table_schema=%s ORDER BY table_name", (dbname,))
@@ -310,10 +586,22 @@ class BackupWorker(QObject):
                     traceback.print_exc()
                     routines = []
             total_items = max(1, len(tables) + len(views) + len(routines))
-            tmp_dir = tempfile.mkdtemp(prefix="hisbak_")
+            zip_dir = os.path.dirname(self._zip_path)
+            os.makedirs(zip_dir, exist_ok=True)
+            # Members are streamed into a .part file that is renamed once the backup completes
+            self._zf = zipfile.ZipFile(part_path, "w", compression=self._compression, compresslevel=self._compresslevel)
             done = 0
             total_tables = len(tables)
-            for t in tables:
+            if self._parallel > 1 and total_tables > 1:
+                # Largest tables first so wall-clock time approaches the biggest single table
+                ordered = sorted(tables, key=lambda name: table_sizes.get(name, 0), reverse=True)
+                if not self._dump_tables_parallel(ordered, total_items):
+                    if self._stop:
+                        self.log_line.emit("หยุดโดยผู้ใช้")
+                        self.ask_ui_reset.emit()
+                    return
+                done = total_tables
+            for t in tables[done:]:
                 if self._stop:
                     self.log_line.emit("หยุดโดยผู้ใช้")
                     self.ask_ui_reset.emit()
@@ -322,151 +610,9 @@ class BackupWorker(QObject):
                     self.log_line.emit(f"[{done+1}/{total_items}] กำลังสำรองตาราง: {t}")
                 except Exception:
                     pass
-                table_file = os.path.join(tmp_dir, f"{t}.sql")
-                with open(table_file, "w", encoding="utf-8") as f:
-                    # Header (Navicat-like)
-                    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    f.write("/*\n")
-                    f.write("Navicat MySQL Data Transfer\n\n")
-                    f.write(f"Source Server         : {source_server}\n")
-                    f.write(f"Source Server Version : {source_version}\n")
-                    f.write(f"Source Host           : {source_host_line}\n")
-                    f.write(f"Source Database       : {self._db_config.get('database') or ''}\n\n")
-                    f.write("Target Server Type    : MYSQL\n")
-                    f.write(f"Target Server Version : {source_version}\n")
-                    f.write("File Encoding         : 65001\n\n")
-                    f.write(f"Date: {now_str}\n")
-                    f.write("*/\n\n")
-                    f.write("SET FOREIGN_KEY_CHECKS=0;\n\n")
-                    with conn.cursor() as cur:
-                        cur.execute(f"SHOW CREATE TABLE `{t}`")
-                        row = cur.fetchone()
-                        create_sql = row[1] if row and len(row) > 1 else None
-                        if isinstance(create_sql, (bytes, bytearray)):
-                            try:
-                                create_sql = create_sql.decode('utf-8', 'ignore')
-                            except Exception:
-                                create_sql = None
-                        if create_sql:
-                            f.write("-- ----------------------------\n")
-                            f.write(f"-- Table structure for {t}\n")
-                            f.write("-- ----------------------------\n")
-                            f.write(f"DROP TABLE IF EXISTS `{t}`;\n")
-                            f.write(create_sql + ";\n\n")
-                        # Read all columns as raw bytes to avoid type conversions (e.g., DECIMAL)
-                        cur.execute(f"SHOW COLUMNS FROM `{t}`")
-                        col_rows = cur.fetchall() or []
-                        col_names = []
-                        col_is_numeric = []
-                        col_is_datetime = []
-                        col_is_stringy = []  # char/varchar/text/enum/set
-                        col_is_blob = []     # blob/binary
-                        col_max_lengths = []  # Store max lengths for string columns
-                        for r in col_rows:
-                            try:
-                                name = r[0]
-                                ctype = r[1] if len(r) > 1 else ''
-                                if isinstance(name, (bytes, bytearray)):
-                                    name = name.decode('utf-8', 'ignore')
-                                else:
-                                    name = str(name)
-                                tstr = ''
-                                if isinstance(ctype, (bytes, bytearray)):
-                                    try:
-                                        tstr = ctype.decode('utf-8', 'ignore')
-                                    except Exception:
-                                        tstr = str(ctype)
-                                else:
-                                    tstr = str(ctype)
-                                tl = tstr.lower()
-                                is_num = any(k in tl for k in [
-                                    'tinyint', 'smallint', 'mediumint', 'int', 'bigint',
-                                    'decimal', 'numeric', 'float', 'double', 'bit'
-                                ])
-                                is_dt = any(k in tl for k in ['date', 'datetime', 'time', 'timestamp', 'year'])
-                                is_str = any(k in tl for k in ['char', 'text', 'enum', 'set'])
-                                is_blob = any(k in tl for k in ['blob', 'binary'])
-                                
-                                # Extract max length from column type for string columns
-                                max_len = None
-                                # For Navicat compatibility, we don't truncate data
-                                # Only set max_len for very long text fields to prevent SQL syntax issues
-                                if is_str:
-                                    import re
-                                    match = re.search(r'(\d+)', tstr)
-                                    if match:
-                                        try:
-                                            max_len = int(match.group(1))
-                                            # For Navicat compatibility, only truncate extremely long values (> 10000 chars)
-                                            if max_len <= 10000:
-                                                max_len = None  # Don't truncate at all
-                                        except Exception:
-                                            max_len = None
-                                
-                                col_names.append(name)
-                                col_is_numeric.append(is_num)
-                                col_is_datetime.append(is_dt)
-                                col_is_stringy.append(is_str)
-                                col_is_blob.append(is_blob)
-                                col_max_lengths.append(max_len)
-                            except Exception:
-                                traceback.print_exc()
-                        if not col_names:
-                            col_names = []
-                            col_is_numeric = []
-                            col_is_datetime = []
-                            col_is_stringy = []
-                            col_is_blob = []
-                            col_max_lengths = []
-                        select_expr = ", ".join([f"CAST(`{c}` AS BINARY) AS `{c}`" for c in col_names]) if col_names else "*"
-                        cur.execute(f"SELECT {select_expr} FROM `{t}`")
-                        rows = cur.fetchall() or []
-                        cols = [desc[0] for desc in cur.description]
-                        cols = [(_as_text(c)) for c in cols]
-                        if rows:
-                            f.write("-- ----------------------------\n")
-                            f.write(f"-- Records of {t}\n")
-                            f.write("-- ----------------------------\n")
-                            for r in rows:
-                                out_vals = []
-                                for idx, v in enumerate(r):
-                                    is_num = col_is_numeric[idx] if idx < len(col_is_numeric) else False
-                                    is_dt = col_is_datetime[idx] if idx < len(col_is_datetime) else False
-                                    is_str = col_is_stringy[idx] if idx < len(col_is_stringy) else False
-                                    is_bin = col_is_blob[idx] if idx < len(col_is_blob) else False
-                                    max_len = col_max_lengths[idx] if idx < len(col_max_lengths) else None
-                                    
-                                    # For Navicat compatibility, use _escape for all values
-                                    if is_bin:
-                                        try:
-                                            b = bytes(v) if isinstance(v, (bytes, bytearray)) else str(v).encode('utf-8', 'ignore')
-                                            out_vals.append('0x' + b.hex())
-                                        except Exception:
-                                            out_vals.append('\'\'')
-                                    else:
-                                        # For all other types (numeric, datetime, string), use _escape
-                                        # decode text with tis-620 -> utf-8 -> latin-1 fallback (Navicat order)
-                                        s = None
-                                        if isinstance(v, (bytes, bytearray)):
-                                            b = bytes(v)
-                                            for enc in ('tis-620', 'utf-8', 'latin-1', 'cp874'):
-                                                try:
-                                                    s = b.decode(enc)
-                                                    break
-                                                except Exception:
-                                                    s = None
-                                        else:
-                                            s = str(v)
-                                        
-                                        # Handle string 'None' values - convert to empty string
-                                        if s == 'None':
-                                            s = ''
-                                        
-                                        # Use the enhanced _escape method with max_length (if any)
-                                        escaped = self._escape(s, max_len)
-                                        out_vals.append(escaped)
-                                values = ", ".join(out_vals)
-                                f.write(f"INSERT INTO `{t}` VALUES ({values});\n")
+                with self._zip_entry(f"{t}.sql") as f:
+                    self._write_header(f)
+                    self._dump_table(conn, t, f)
                 done += 1
                 pct = int(done * 100 / total_items)
                 self.progress_changed.emit(pct)
@@ -481,21 +627,8 @@ class BackupWorker(QObject):
                     self.log_line.emit(f"[{done+1}/{total_items}] กำลังสำรองวิว: {vname}")
                 except Exception:
                     pass
-                view_file = os.path.join(tmp_dir, f"view_{vname}.sql")
-                with open(view_file, "w", encoding="utf-8") as f:
-                    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    f.write("/*\n")
-                    f.write("Navicat MySQL Data Transfer\n\n")
-                    f.write(f"Source Server         : {source_server}\n")
-                    f.write(f"Source Server Version : {source_version}\n")
-                    f.write(f"Source Host           : {source_host_line}\n")
-                    f.write(f"Source Database       : {self._db_config.get('database') or ''}\n\n")
-                    f.write("Target Server Type    : MYSQL\n")
-                    f.write(f"Target Server Version : {source_version}\n")
-                    f.write("File Encoding         : 65001\n\n")
-                    f.write(f"Date: {now_str}\n")
-                    f.write("*/\n\n")
-                    f.write("SET FOREIGN_KEY_CHECKS=0;\n\n")
+                with self._zip_entry(f"view_{vname}.sql") as f:
+                    self._write_header(f)
                     f.write("-- ----------------------------\n")
                     f.write(f"-- View structure for {vname}\n")
                     f.write("-- ----------------------------\n")
@@ -528,21 +661,8 @@ class BackupWorker(QObject):
                 except Exception:
                     pass
                 ext = 'proc' if rtype_u == 'PROCEDURE' else 'func'
-                fn = os.path.join(tmp_dir, f"{ext}_{rname}.sql")
-                with open(fn, "w", encoding="utf-8") as f:
-                    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    f.write("/*\n")
-                    f.write("Navicat MySQL Data Transfer\n\n")
-                    f.write(f"Source Server         : {source_server}\n")
-                    f.write(f"Source Server Version : {source_version}\n")
-                    f.write(f"Source Host           : {source_host_line}\n")
-                    f.write(f"Source Database       : {self._db_config.get('database') or ''}\n\n")
-                    f.write("Target Server Type    : MYSQL\n")
-                    f.write(f"Target Server Version : {source_version}\n")
-                    f.write("File Encoding         : 65001\n\n")
-                    f.write(f"Date: {now_str}\n")
-                    f.write("*/\n\n")
-                    f.write("SET FOREIGN_KEY_CHECKS=0;\n\n")
+                with self._zip_entry(f"{ext}_{rname}.sql") as f:
+                    self._write_header(f)
                     with conn.cursor() as cur:
                         if rtype_u == 'PROCEDURE':
                             cur.execute(f"SHOW CREATE PROCEDURE `{rname}`")
@@ -569,14 +689,11 @@ class BackupWorker(QObject):
                 done += 1
                 pct = int(done * 100 / total_items)
                 self.progress_changed.emit(pct)
-            zip_dir = os.path.dirname(self._zip_path)
-            os.makedirs(zip_dir, exist_ok=True)
-            with zipfile.ZipFile(self._zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-                for name in os.listdir(tmp_dir):
-                    p = os.path.join(tmp_dir, name)
-                    if os.path.isfile(p):
-                        zf.write(p, arcname=name)
-            
+            self._zf.close()
+            self._zf = None
+            os.replace(part_path, self._zip_path)
+            completed = True
+
             self.log_line.emit("Navicat-style backup completed successfully")
             self.finished_ok.emit(self._zip_path)
         except Exception as e:
@@ -592,8 +709,14 @@ class BackupWorker(QObject):
                         pass
                     self._conn = None
                     
-                # Clean up temp directory
-                if tmp_dir and os.path.isdir(tmp_dir):
-                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                # Drop the partial ZIP of a stopped or failed backup
+                if self._zf is not None:
+                    try:
+                        self._zf.close()
+                    except Exception:
+                        pass
+                    self._zf = None
+                if not completed and os.path.exists(part_path):
+                    os.remove(part_path)
             except Exception:
                 traceback.print_exc()
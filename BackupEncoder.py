@@ -0,0 +1,117 @@
+import re
+from typing import Callable, List, Optional, Sequence
+
+
+# Column kinds resolved once per table from SHOW COLUMNS types
+KIND_TEXT = 0
+KIND_BINARY = 1
+
+# Only declared lengths above this are enforced (Navicat does not truncate normal columns)
+TRUNCATE_ABOVE = 10000
+
+# One translate table escapes everything a single-line SQL string literal needs
+_ESCAPE_TABLE = str.maketrans({
+    "\\": "\\\\",
+    "'": "\\'",
+    "\n": "\\n",
+    "\r": "\\r",
+    "\0": "\\0",
+    "\x1a": "\\Z",
+})
+_NEEDS_ESCAPE = re.compile(r"[\\'\n\r\0\x1a]")
+_NEEDS_ESCAPE_BYTES = re.compile(rb"[\\'\n\r\0\x1a]")
+_CELL_SEP = b"', '"
+_LENGTH = re.compile(r"(\d+)")
+
+
+def column_kind(type_str: str) -> tuple:
+    """(kind, max_len) for a SHOW COLUMNS type such as "varchar(255)" or "longblob"."""
+    tl = str(type_str or "").lower()
+    if "blob" in tl or "binary" in tl:
+        return KIND_BINARY, None
+    max_len = None
+    if any(k in tl for k in ("char", "text", "enum", "set")):
+        m = _LENGTH.search(tl)
+        if m and int(m.group(1)) > TRUNCATE_ABOVE:
+            max_len = int(m.group(1))
+    return KIND_TEXT, max_len
+
+
+def decode_text(b: bytes) -> str:
+    """Navicat decode order: tis-620, then utf-8, then latin-1 (which always succeeds)."""
+    if b.isascii():
+        return b.decode("ascii")
+    try:
+        return b.decode("tis-620")
+    except UnicodeDecodeError:
+        pass
+    try:
+        return b.decode("utf-8")
+    except UnicodeDecodeError:
+        return b.decode("latin-1")
+
+
+def encode_text(v, max_len: Optional[int] = None) -> str:
+    """SQL literal for a text/number/date cell; NULL and the string 'None' become '' like Navicat."""
+    if v is None:
+        return "''"
+    if type(v) is bytes:
+        if v.isascii():
+            s = v.decode("ascii")
+        else:
+            s = decode_text(v)
+    elif isinstance(v, (bytes, bytearray)):
+        s = decode_text(bytes(v))
+    else:
+        s = str(v)
+    if s == "None":
+        return "''"
+    if max_len and len(s) > max_len:
+        s = s[:max_len]
+    if _NEEDS_ESCAPE.search(s):
+        s = s.translate(_ESCAPE_TABLE)
+    return "'" + s + "'"
+
+
+def encode_binary(v) -> str:
+    """Hex literal for a blob/binary cell; NULL and empty values become ''."""
+    if v is None:
+        return "''"
+    b = bytes(v) if isinstance(v, (bytes, bytearray)) else str(v).encode("utf-8", "ignore")
+    return "0x" + b.hex() if b else "''"
+
+
+def build_row_encoder(column_types: Sequence[str]) -> Callable[[tuple], str]:
+    """Compile a row -> "(v1, v2, ...)" function for one table's SHOW COLUMNS types.
+
+    Column kinds are resolved here, once. A table of plain text/number/date
+    columns (the common case) encodes with a single map(); mixed tables use a
+    per-column function list. Rows must have one value per column type (or,
+    with no types at all, any width; every cell is then encoded as text).
+    """
+    kinds = [column_kind(t) for t in column_types]
+    if all(k == KIND_TEXT and m is None for k, m in kinds):
+        def encode_row(row) -> str:
+            # Whole-row fast path: no NULL/'None' cells and nothing to escape, so the
+            # row is one join and one decode (tis-620 decodes cell by cell identically)
+            if None not in row and b"None" not in row:
+                try:
+                    if not _NEEDS_ESCAPE_BYTES.search(b"".join(row)):
+                        return "('" + _CELL_SEP.join(row).decode("tis-620") + "')"
+                except (TypeError, UnicodeDecodeError):
+                    pass
+            return "(" + ", ".join(map(encode_text, row)) + ")"
+        return encode_row
+
+    funcs: List[Callable] = []
+    for kind, max_len in kinds:
+        if kind == KIND_BINARY:
+            funcs.append(encode_binary)
+        elif max_len:
+            funcs.append(lambda v, _n=max_len: encode_text(v, _n))
+        else:
+            funcs.append(encode_text)
+
+    def encode_row(row) -> str:
+        return "(" + ", ".join([fn(v) for fn, v in zip(funcs, row)]) + ")"
+    return encode_row
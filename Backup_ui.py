@@ -9,6 +9,8 @@ from PyQt6.QtWidgets import (
     QProgressBar,
     QTextEdit,
     QGroupBox,
+    QSpinBox,
+    QComboBox,
 )
 from PyQt6.QtCore import Qt, QLocale
 
@@ -57,6 +59,23 @@ class Backup_ui(object):
         self.btn_start = QPushButton("เริ่ม Backup")
         self.btn_stop = QPushButton("หยุด")
         self.btn_stop.setEnabled(False)
+        self.lbl_parallel = QLabel("การเชื่อมต่อพร้อมกัน:")
+        self.spin_parallel = QSpinBox()
+        self.spin_parallel.setRange(1, 8)
+        self.spin_parallel.setValue(1)
+        self.spin_parallel.setToolTip("จำนวนการเชื่อมต่อที่สำรองตารางพร้อมกัน (1 = ทีละตาราง)")
+        self.lbl_compression = QLabel("การบีบอัด:")
+        self.cmb_compression = QComboBox()
+        self.cmb_compression.setToolTip("วิธีบีบอัดไฟล์ ZIP (stored = ไม่บีบอัด)")
+        self.spin_compresslevel = QSpinBox()
+        self.spin_compresslevel.setRange(0, 9)
+        self.spin_compresslevel.setValue(6)
+        self.spin_compresslevel.setToolTip("ระดับการบีบอัด (deflate 0-9, bzip2 1-9)")
+        ly_ctrl.addWidget(self.lbl_parallel)
+        ly_ctrl.addWidget(self.spin_parallel)
+        ly_ctrl.addWidget(self.lbl_compression)
+        ly_ctrl.addWidget(self.cmb_compression)
+        ly_ctrl.addWidget(self.spin_compresslevel)
         ly_ctrl.addWidget(self.btn_start)
         ly_ctrl.addWidget(self.btn_stop)
         box_ctrl.setLayout(ly_ctrl)
@@ -0,0 +1,183 @@
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Optional
+
+
+# Pool defaults (overridable via QSettings db_pool_max_idle / db_pool_idle_timeout / db_pool_ping_interval)
+DB_POOL_MAX_IDLE = 4
+DB_POOL_IDLE_TIMEOUT = 300
+DB_POOL_PING_INTERVAL = 30
+
+
+class DbPool:
+    """Small thread-safe pool of pymysql connections for one DB config.
+
+    acquire() is per-thread: a thread that already holds a connection gets the
+    same one back (release() must be called as many times), so nested helpers
+    share one connection and one transaction. A connection that sat idle longer
+    than ping_interval is pinged before reuse and replaced when dead; idle
+    connections older than idle_timeout are closed, and at most max_idle are
+    kept. release() rolls back any open transaction so the next user does not
+    read from a stale snapshot.
+    """
+
+    def __init__(self, cfg: dict, max_idle: int = DB_POOL_MAX_IDLE, idle_timeout: float = DB_POOL_IDLE_TIMEOUT,
+                 ping_interval: float = DB_POOL_PING_INTERVAL):
+        self._cfg = dict(cfg)
+        self.max_idle = max(0, int(max_idle))
+        self.idle_timeout = float(idle_timeout)
+        self.ping_interval = float(ping_interval)
+        self._lock = threading.Lock()
+        self._idle = []  # [(conn, released_at)] most recently released last
+        self._local = threading.local()
+        self._stats = {"created": 0, "reused": 0, "discarded": 0}
+
+    def _connect(self):
+        import pymysql
+        conn = pymysql.connect(**self._cfg)
+        with self._lock:
+            self._stats["created"] += 1
+        return conn
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"[DBPOOL] close failed: {e}")
+
+    def _evict(self, now: float) -> list:
+        # Caller holds self._lock; returns connections to close outside the lock
+        doomed = [c for c, t in self._idle if now - t > self.idle_timeout]
+        self._idle = [(c, t) for c, t in self._idle if now - t <= self.idle_timeout]
+        while len(self._idle) > self.max_idle:
+            doomed.append(self._idle.pop(0)[0])
+        self._stats["discarded"] += len(doomed)
+        return doomed
+
+    def acquire(self):
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            held[1] += 1
+            return held[0]
+        conn = None
+        while conn is None:
+            now = time.monotonic()
+            with self._lock:
+                doomed = self._evict(now)
+                entry = self._idle.pop() if self._idle else None
+            for c in doomed:
+                self._close(c)
+            if entry is None:
+                conn = self._connect()
+                break
+            candidate, released_at = entry
+            if now - released_at > self.ping_interval:
+                try:
+                    candidate.ping(reconnect=False)
+                except Exception as e:
+                    print(f"[DBPOOL] idle connection dead, replacing: {e}")
+                    self._close(candidate)
+                    with self._lock:
+                        self._stats["discarded"] += 1
+                    continue
+            conn = candidate
+            with self._lock:
+                self._stats["reused"] += 1
+        self._local.held = [conn, 1, False]  # conn, hold count, discard on final release
+        return conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        """Return conn; discard=True closes it (e.g. after an error or an abandoned unbuffered result).
+
+        A nested release only marks the connection; it is closed when the outermost holder releases it.
+        """
+        held = getattr(self._local, "held", None)
+        if held is not None and held[0] is conn:
+            held[1] -= 1
+            # An outer holder on this thread still uses conn: only remember to discard it
+            held[2] = held[2] or discard
+            if held[1] > 0:
+                return
+            discard = held[2]
+            self._local.held = None
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self._close(conn)
+            with self._lock:
+                self._stats["discarded"] += 1
+            return
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+            doomed = self._evict(time.monotonic())
+        for c in doomed:
+            self._close(c)
+
+    @contextmanager
+    def connection(self):
+        """``with pool.connection() as conn:``; the connection is discarded if the block raises."""
+        conn = self.acquire()
+        ok = False
+        try:
+            yield conn
+            ok = True
+        finally:
+            self.release(conn, discard=not ok)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for c, _ in idle:
+            self._close(c)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle))
+
+
+_pools_lock = threading.Lock()
+_pools = {}
+
+
+def _pool_key(cfg: dict) -> tuple:
+    return tuple(sorted((str(k), str(v)) for k, v in cfg.items()))
+
+
+def get_pool(cfg: dict, settings=None) -> DbPool:
+    """Shared pool for this DB config; settings (QSettings) supplies the pool limits on first use."""
+    key = _pool_key(cfg)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            opts = {}
+            if settings is not None:
+                for name, attr, default in (
+                    ("db_pool_max_idle", "max_idle", DB_POOL_MAX_IDLE),
+                    ("db_pool_idle_timeout", "idle_timeout", DB_POOL_IDLE_TIMEOUT),
+                    ("db_pool_ping_interval", "ping_interval", DB_POOL_PING_INTERVAL),
+                ):
+                    try:
+                        opts[attr] = float(settings.value(name, default))
+                    except Exception as e:
+                        traceback.print_exc()
+            pool = _pools[key] = DbPool(cfg, **opts)
+        return pool
+
+
+def close_pools(cfg: Optional[dict] = None) -> None:
+    """Close idle connections of cfg's pool, or of every pool (e.g. after the DB settings change)."""
+    with _pools_lock:
+        if cfg is None:
+            pools = list(_pools.values())
+            _pools.clear()
+        else:
+            pool = _pools.pop(_pool_key(cfg), None)
+            pools = [pool] if pool is not None else []
+    for pool in pools:
+        pool.close_all()
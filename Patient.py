@@ -1,37 +1,192 @@
 import sys
-from typing import List, Any
+from typing import List
 import traceback
 from datetime import datetime
 
-from PyQt6.QtWidgets import QWidget, QApplication, QMessageBox, QInputDialog, QMenu, QAbstractItemView, QProgressDialog
+from PyQt6.QtWidgets import QWidget, QApplication, QMessageBox, QInputDialog, QMenu, QAbstractItemView, QProgressDialog, QCheckBox
 from PyQt6.QtCore import QSettings, Qt, QSortFilterProxyModel, QRegularExpression, QObject, pyqtSignal, QThread, QCoreApplication, QTimer
 from PyQt6.QtGui import QGuiApplication
-from PyQt6.QtGui import QStandardItemModel, QStandardItem
 
 from Patient_ui import Patient_ui
+from DbPool import get_pool
+from RightsParser import parse_response
+from RightsTableModel import RightsTableModel
+from RosterCache import RosterCache, roster_target
+from SweepCheckpoint import SweepCheckpoint
 from srm import (
     read_token,
     ensure_srm_check_table,
-    was_checked_today,
-    is_patient_dead,
-    upsert_srm_check,
-    update_patient_death,
-    call_right_search,
+    load_checked_cids,
+    load_dead_cids,
+    SrmCheckWriter,
+    RightsUpdateWriter,
+    right_search_pipeline,
+    response_cache,
+    cache_ttl_from_settings,
+    token_manager,
+    RIGHTS_MAX_IN_FLIGHT,
+    configure_http_from_settings,
+    http_stats,
     refresh_token,
     open_srm_program,
-    _has_hosxp_death_flag,
+    column_exists,
+    probe_schema,
+    is_valid_cid,
+    patient_list_query,
+    missing_indexes,
+    create_index,
+    day_range_sql,
 )
 
 
+# Rows per batch streamed from the server-side cursor to the table model
+PATIENT_LOAD_BATCH = 2000
+
+
+class PatientLoadWorker(QObject):
+    """Stream the patient list with a server-side cursor and hand rows to the GUI in batches.
+
+    With since set, only rows whose last_update (HOSxP) / dateupdate (JHCIS) is at
+    or after that high-water mark are read; rows that are no longer listable
+    (dead or discharged) are reported through removed_cids instead of rows_ready.
+    """
+
+    headers_ready = pyqtSignal(list)
+    rows_ready = pyqtSignal(list)
+    removed_cids = pyqtSignal(list)
+    high_water = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal(int, bool)  # total rows, cancelled
+
+    def __init__(self, cfg: dict, system: str, batch_size: int = PATIENT_LOAD_BATCH, since=None):
+        super().__init__()
+        self._cfg = dict(cfg)
+        self._system = system
+        self._batch_size = max(1, int(batch_size))
+        self._since = since
+        self._stop = False
+
+    def request_stop(self):
+        self._stop = True
+
+    def run(self):
+        import pymysql.cursors
+
+        total = 0
+        conn = None
+        ok = False
+        delta = self._since is not None
+        mark = self._since
+        pool = get_pool(self._cfg)
+        try:
+            conn = pool.acquire()
+            # Probe HIS schema capabilities once; later checks hit the cache
+            try:
+                probe_schema(conn)
+            except Exception as e:
+                traceback.print_exc()
+            sql, params = patient_list_query(conn, self._system, self._since)
+            # Unbuffered cursor: rows arrive as the server sends them
+            cur = conn.cursor(pymysql.cursors.SSCursor)
+            cur.execute(sql, params)
+            headers = [col[0] for col in cur.description]
+            if delta:
+                headers = headers[:-1]
+            self.headers_ready.emit(headers)
+            while not self._stop:
+                batch = cur.fetchmany(self._batch_size)
+                if not batch:
+                    break
+                rows = []
+                removed = []
+                for r in batch:
+                    if not is_valid_cid(r[0]):
+                        continue
+                    # last_update / last_update_right is the 7th column in every variant
+                    stamp = r[6]
+                    if isinstance(stamp, datetime) and (mark is None or stamp > mark):
+                        mark = stamp
+                    if delta:
+                        if r[-1]:
+                            rows.append(r[:-1])
+                        else:
+                            removed.append(str(r[0]))
+                    else:
+                        rows.append(r)
+                if rows:
+                    total += len(rows)
+                    self.rows_ready.emit(rows)
+                if removed:
+                    self.removed_cids.emit(removed)
+            if not self._stop:
+                cur.close()
+                ok = True
+                if mark is not None:
+                    self.high_water.emit(mark)
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(str(e))
+        finally:
+            # A cancelled load is discarded: closing abandons unread rows without draining them
+            if conn is not None:
+                try:
+                    pool.release(conn, discard=not ok)
+                except Exception as e:
+                    traceback.print_exc()
+            self.finished.emit(total, bool(self._stop))
+
+
+class IndexAdvisorWorker(QObject):
+    """Probe for missing rights-sweep indexes, or create the given ones, off the GUI thread.
+
+    With create=None the worker only probes and reports through missing_found;
+    otherwise it runs CREATE INDEX for each (table, column, name) in create.
+    """
+
+    missing_found = pyqtSignal(list)
+    progress = pyqtSignal(int, str)  # indexes done, "table(column)" being created
+    finished = pyqtSignal(list)  # failure messages
+
+    def __init__(self, cfg: dict, system: str, create=None):
+        super().__init__()
+        self._cfg = dict(cfg)
+        self._system = system
+        self._create = list(create) if create is not None else None
+
+    def run(self):
+        failed = []
+        pool = get_pool(self._cfg)
+        try:
+            with pool.connection() as conn:
+                if self._create is None:
+                    self.missing_found.emit(missing_indexes(conn, self._system))
+                else:
+                    for i, (t, c, name) in enumerate(self._create):
+                        self.progress.emit(i, f"{t}({c})")
+                        try:
+                            create_index(conn, t, c, name)
+                        except Exception as e:
+                            traceback.print_exc()
+                            failed.append(f"{t}({c}): {e}")
+                    self.progress.emit(len(self._create), "")
+        except Exception as e:
+            traceback.print_exc()
+            failed.append(str(e))
+        finally:
+            self.finished.emit(failed)
+
+
 class Patient(QWidget, Patient_ui):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setupUi(self)
 
         self.settings = QSettings("SRM_API", "MySQL_Settings")
+        configure_http_from_settings(self.settings)
 
         # Wire events
         self.refresh_button.clicked.connect(self.on_refresh_token)
+        self.refresh_list_button.clicked.connect(self.refresh_patients)
         # Header context menu for filtering
         header = self.table.horizontalHeader()
         header.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
@@ -51,14 +206,11 @@ class Patient(QWidget, Patient_ui):
         except Exception as e:
             traceback.print_exc()
 
-        # Initial load
-        self.load_patients()
-        # After load, mark rows already checked today
-        try:
-            self.proxy.modelReset.connect(self._mark_checked_today_in_view)
-        except Exception as e:
-            traceback.print_exc()
-        QTimer.singleShot(0, self._mark_checked_today_in_view)
+        # Initial load: cached roster first (if any), then a background delta against the HIS
+        self._roster_cache = RosterCache()
+        self._warm_start()
+        # Offer to create indexes the rights sweep depends on
+        QTimer.singleShot(0, self._advise_indexes)
 
         # Toggle rights check button (single button with two states)
         try:
@@ -84,6 +236,9 @@ class Patient(QWidget, Patient_ui):
             "connect_timeout": int(self.settings.value("timeout", 10)),
         }
 
+    def _db_pool(self):
+        return get_pool(self._get_db_config(), self.settings)
+
     def _ensure_config_complete(self) -> bool:
         cfg = self._get_db_config()
         system = str(self.settings.value("system", "jhcis")).strip().lower()
@@ -95,84 +250,162 @@ class Patient(QWidget, Patient_ui):
         return True
 
     def load_patients(self):
+        """Full load: rebuild the list from the HIS and reset the high-water mark."""
+        self._start_load(since=None)
+
+    def _roster_cache_enabled(self) -> bool:
+        return str(self.settings.value("roster_cache", "true")).lower() in ("1", "true")
+
+    def _warm_start(self):
+        """Render the last saved roster for this DB target, then reconcile with a delta load."""
+        if not self._roster_cache_enabled() or not self._ensure_config_complete():
+            self.load_patients()
+            return
+        system = str(self.settings.value("system", "jhcis")).strip().lower()
+        snap = self._roster_cache.load(roster_target(self._get_db_config(), system))
+        if not snap or snap[2] is None:
+            self.load_patients()
+            return
+        headers, rows, high_water = snap
+        self._populate_table(headers, rows)
+        self._high_water = high_water
+        self._show_status(f"แสดงรายชื่อจากแคช {len(rows):,} รายการ กำลังอัปเดตจาก HIS...", 5000)
+        self._start_load(since=high_water, quiet=True)
+
+    def _save_roster_cache(self):
+        if not self._roster_cache_enabled():
+            return
+        model = getattr(self, 'source_model', None)
+        if model is None or getattr(self, '_high_water', None) is None:
+            return
+        try:
+            system = str(self.settings.value("system", "jhcis")).strip().lower()
+            self._roster_cache.save_async(
+                roster_target(self._get_db_config(), system),
+                model.headers()[1:-2],
+                model.snapshot_rows(),
+                self._high_water,
+            )
+        except Exception as e:
+            traceback.print_exc()
+
+    def refresh_patients(self):
+        """Delta refresh: merge rows changed since the last load; falls back to a full load."""
+        if getattr(self, "_is_checking", False):
+            self._show_status("กำลังตรวจสอบสิทธิ โปรดหยุดก่อนรีเฟรชรายชื่อ", 4000)
+            return
+        since = getattr(self, '_high_water', None)
+        if since is None or getattr(self, 'source_model', None) is None:
+            self.load_patients()
+        else:
+            self._start_load(since=since)
+
+    def _start_load(self, since=None, quiet: bool = False):
         if not self._ensure_config_complete():
             return
-        dlg = QProgressDialog("กำลังโหลดรายชื่อ...", "", 0, 0, self)
-        dlg.setWindowTitle("กำลังโหลด")
-        dlg.setCancelButton(None)
-        dlg.setWindowModality(Qt.WindowModality.WindowModal)
-        dlg.setMinimumDuration(0)
-        dlg.show()
+        if getattr(self, '_load_thread', None) is not None:
+            return
+        delta = since is not None
+        label = "กำลังรีเฟรชรายชื่อ..." if delta else "กำลังโหลดรายชื่อ..."
+        dlg = None
+        if not quiet:
+            dlg = QProgressDialog(label, "ยกเลิก", 0, 0, self)
+            dlg.setWindowTitle("กำลังโหลด")
+            dlg.setWindowModality(Qt.WindowModality.NonModal)
+            dlg.setMinimumDuration(0)
+            dlg.setAutoClose(False)
+            dlg.setAutoReset(False)
+        self._load_dialog = dlg
+
+        cfg = self._get_db_config()
+        self._db_pool()
+        system = str(self.settings.value("system", "jhcis")).strip().lower()
         try:
-            QApplication.processEvents()
-            import pymysql
+            batch_size = int(self.settings.value("load_batch_size", PATIENT_LOAD_BATCH))
+        except (TypeError, ValueError):
+            batch_size = PATIENT_LOAD_BATCH
+        if not delta:
+            self._high_water = None
+        self._loading = True
+        self._load_thread = QThread(self)
+        self._load_worker = PatientLoadWorker(cfg, system, batch_size, since=since)
+        self._load_worker.moveToThread(self._load_thread)
+        self._load_thread.started.connect(self._load_worker.run)
+        merged = {"updated": 0, "inserted": 0, "removed": 0}
 
-            cfg = self._get_db_config()
-            conn = pymysql.connect(**cfg)
-            with conn.cursor() as cur:
-                system = str(self.settings.value("system", "jhcis")).strip().lower()
-                if system == "jhcis":
-                    cur.execute(
-                        """
-                        SELECT 
-                            p.idcard          AS cid,
-                            t.titlename       AS pname,
-                            p.fname           AS fname,
-                            p.lname           AS lname,
-                            p.rightcode       AS pttype,
-                            p.rightno         AS pttype_no,
-                            p.dateupdate      AS last_update_right
-                        FROM person p
-                        LEFT JOIN ctitle t ON p.prename = t.titlecode
-                        WHERE CHAR_LENGTH(p.idcard) = 13 
-                          AND p.idcard REGEXP '^[0-9]{13}$'
-                          AND (p.dischargedate IS NULL OR p.dischargedate = '0000-00-00')
-                        """
-                    )
+        def on_headers(headers: list):
+            if not delta:
+                self._populate_table(headers, [])
+
+        def on_rows(rows: list):
+            try:
+                if delta:
+                    updated, inserted = self.source_model.upsert_rows(rows)
+                    merged["updated"] += updated
+                    merged["inserted"] += inserted
                 else:
-                    dead_cids = []
-                    try:
-                        if _has_hosxp_death_flag(conn):
-                            cur.execute(
-                                """
-                                SELECT cid FROM patient
-                                WHERE death='Y' AND CHAR_LENGTH(cid)=13 AND cid REGEXP '^[0-9]{13}$'
-                                """
-                            )
-                            dead_cids = [str(r[0]) for r in (cur.fetchall() or []) if r and r[0]]
-                    except Exception as e:
-                        traceback.print_exc()
-                        dead_cids = []
-
-                    if dead_cids:
-                        placeholders = ",".join(["%s"] * len(dead_cids))
-                        sql = (
-                            """
-                            SELECT cid, pname, fname, lname, pttype, pttype_no, last_update
-                            FROM patient
-                            WHERE CHAR_LENGTH(cid) = 13 AND cid REGEXP '^[0-9]{13}$'
-                              AND cid NOT IN (""" + placeholders + ")"
-                        )
-                        cur.execute(sql, dead_cids)
-                    else:
-                        cur.execute(
-                            """
-                            SELECT cid, pname, fname, lname, pttype, pttype_no, last_update
-                            FROM patient
-                            WHERE CHAR_LENGTH(cid) = 13 AND cid REGEXP '^[0-9]{13}$'
-                            """
-                        )
-                rows = cur.fetchall()
-                headers = [col[0] for col in cur.description]
-            conn.close()
-
-            self._populate_table(headers, rows)
-        finally:
+                    self.source_model.append_rows(rows)
+                    if dlg is not None:
+                        dlg.setLabelText(f"{label} {self.source_model.rowCount():,} รายการ")
+            except Exception as e:
+                traceback.print_exc()
+
+        def on_removed(cids: list):
             try:
-                dlg.close()
+                merged["removed"] += self.source_model.remove_cids(cids)
             except Exception as e:
                 traceback.print_exc()
 
+        def on_high_water(mark):
+            self._high_water = mark
+
+        def on_failed(message: str):
+            QMessageBox.warning(self, "โหลดรายชื่อไม่สำเร็จ", message)
+
+        def on_finished(total: int, cancelled: bool):
+            self._loading = False
+            try:
+                if dlg is not None:
+                    dlg.close()
+            except Exception as e:
+                traceback.print_exc()
+            if cancelled:
+                self._show_status(f"ยกเลิกการโหลด (โหลดแล้ว {total:,} รายการ)", 5000)
+            elif delta:
+                self._show_status(
+                    f"รีเฟรชรายชื่อแล้ว: แก้ไข {merged['updated']:,} เพิ่ม {merged['inserted']:,} นำออก {merged['removed']:,} รายการ",
+                    5000,
+                )
+            else:
+                self._show_status(f"โหลดรายชื่อแล้ว {total:,} รายการ", 5000)
+            self._load_thread.quit()
+            self._load_thread.wait()
+            try:
+                self._load_worker.deleteLater()
+                self._load_thread.deleteLater()
+            except Exception:
+                pass
+            self._load_worker = None
+            self._load_thread = None
+            # Keep the local roster snapshot in step for the next warm start
+            if not cancelled:
+                self._save_roster_cache()
+            # Tick rows already checked today once the list is complete
+            self._mark_checked_today_in_view()
+
+        self._load_worker.headers_ready.connect(on_headers)
+        self._load_worker.rows_ready.connect(on_rows)
+        self._load_worker.removed_cids.connect(on_removed)
+        self._load_worker.high_water.connect(on_high_water)
+        self._load_worker.failed.connect(on_failed)
+        self._load_worker.finished.connect(on_finished)
+        if dlg is not None:
+            worker = self._load_worker
+            # A lambda runs on the GUI thread; a bound worker slot would be queued behind run()
+            dlg.canceled.connect(lambda: worker.request_stop())
+            dlg.show()
+        self._load_thread.start()
+
     def _populate_table(self, headers: List[str], rows: List[tuple]):
         # Prepend a 'check' column
         headers_with_check = ["check"] + headers + ["pttype_new", "pttype_no_new"]
@@ -194,33 +427,9 @@ class Patient(QWidget, Patient_ui):
             self.pttype_no_new_col = headers_with_check.index("pttype_no_new")
         except ValueError:
             self.pttype_no_new_col = -1
-        model = QStandardItemModel()
-        model.setColumnCount(len(headers_with_check))
-        model.setHorizontalHeaderLabels(headers_with_check)
-
-        for r in rows:
-            items: List[QStandardItem] = []
-            # Checkbox item
-            chk = QStandardItem()
-            chk.setCheckable(True)
-            chk.setCheckState(Qt.CheckState.Unchecked)
-            chk.setEditable(False)
-            items.append(chk)
-            for val in r:
-                if val is None:
-                    text = ""
-                else:
-                    try:
-                        text = str(val)
-                    except Exception as e:
-                        traceback.print_exc()
-                        text = repr(val)
-                it = QStandardItem(text)
-                items.append(it)
-            # Append placeholders for new columns
-            items.append(QStandardItem(""))
-            items.append(QStandardItem(""))
-            model.appendRow(items)
+        # Column-array model; cells are produced on demand instead of one QStandardItem each
+        model = RightsTableModel(headers_with_check[1:-2], rows, self)
+        self.source_model = model
 
         # Assign model via proxy for filtering/sorting
         self.proxy = QSortFilterProxyModel(self)
@@ -284,16 +493,6 @@ class Patient(QWidget, Patient_ui):
                 except Exception as e:
                     traceback.print_exc()
 
-    def _read_token(self) -> str:
-        import os
-        token_file = os.path.join(os.environ['USERPROFILE'], 'SRM Smart Card Single Sign-On', 'token.txt')
-        with open(token_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('access-token='):
-                    return line.split('=', 1)[1]
-        raise ValueError('ไม่พบ access-token ในไฟล์ token.txt')
-
     def _set_checking_state(self, running: bool):
         self._is_checking = bool(running)
         try:
@@ -305,6 +504,8 @@ class Patient(QWidget, Patient_ui):
     def on_toggle_check_rights(self):
         if getattr(self, "_is_checking", False):
             self.on_stop_rights()
+        elif getattr(self, "_loading", False):
+            self._show_status("กำลังโหลดรายชื่อ โปรดรอสักครู่", 4000)
         else:
             self.check_rights()
 
@@ -340,6 +541,9 @@ class Patient(QWidget, Patient_ui):
         # Prepare worker thread
         try:
             token = read_token()
+            # Share the file's token with the manager and keep it fresh ahead of expiry
+            token_manager.set(token)
+            token_manager.start_auto_refresh()
         except Exception as e:
             traceback.print_exc()
             try:
@@ -347,9 +551,17 @@ class Patient(QWidget, Patient_ui):
             except Exception as e2:
                 traceback.print_exc()
             return
-        cfg = self._get_db_config()
+        pool = self._db_pool()
         system = str(self.settings.value("system", "jhcis")).strip().lower()
         auto_update = getattr(self, 'auto_update_checkbox', None) and self.auto_update_checkbox.isChecked()
+        try:
+            max_in_flight = int(self.settings.value("rights_concurrency", RIGHTS_MAX_IN_FLIGHT))
+        except Exception as e:
+            traceback.print_exc()
+            max_in_flight = RIGHTS_MAX_IN_FLIGHT
+        # Forced (single-CID) checks always call the API; sweeps reuse recent answers
+        cache_ttl = cache_ttl_from_settings(self.settings, "single" if force else "sweep")
+        checkpoint = None if force else getattr(self, '_checkpoint', None)
 
         class RightsWorker(QObject):
             progress_row = pyqtSignal(int)
@@ -357,9 +569,10 @@ class Patient(QWidget, Patient_ui):
             finished_summary = pyqtSignal(int, int, int, int, bool)  # skipped_today, skipped_dead, succeeded, failed, token_expired
             need_resume_from = pyqtSignal(int)  # row index to resume from when token expired
             update_rights = pyqtSignal(int, str, str, str)  # proxy_row, cid, pttype_new, pttype_no_new
-            def __init__(self, system: str, patient_instance, debug: bool = False, force: bool = False, auto_update: bool = False):
+            def __init__(self, system: str, patient_instance, debug: bool = False, force: bool = False, auto_update: bool = False, max_in_flight: int = RIGHTS_MAX_IN_FLIGHT):
                 super().__init__()
                 self._stop = False
+                self._max_in_flight = max(1, int(max_in_flight or 1))
                 self._debug = bool(debug)
                 self._force_recheck = bool(force)
                 self._alerted_once = False
@@ -370,17 +583,45 @@ class Patient(QWidget, Patient_ui):
                 self._stop = True
 
             def run(self):
-                import pymysql
                 import json
-                db_conn = pymysql.connect(**cfg)
+                db_conn = pool.acquire()
                 ensure_srm_check_table(db_conn)
+                # Buffer srm_check results; flushed in batches and always in finally
+                rights_writer = RightsUpdateWriter(db_conn, self._system)
+                # Queued HIS updates are written before the srm_check rows that follow them
+                check_writer = SrmCheckWriter(db_conn, before_flush=rights_writer.flush)
                 skipped_today = 0
                 skipped_dead = 0
                 succeeded = 0
                 failed = 0
                 token_expired = False
+                # Pre-flight: fetch today's checked set and the dead set once instead of per CID
+                dead_cids = load_dead_cids(db_conn)
+                checked_cids = set() if self._force_recheck else load_checked_cids(db_conn)
                 try:
+                    cached = response_cache.preload(db_conn, cache_ttl)
+                except Exception as e:
+                    traceback.print_exc()
+                    cached = 0
+                print(f"[PREFLIGHT] rows={len(rows)} checked_today={len(checked_cids)} dead={len(dead_cids)} cached={cached}")
+
+                def jobs():
+                    nonlocal skipped_dead
                     for proxy_row, cid in rows:
+                        if cid in dead_cids:
+                            try:
+                                print(f"[INFO] CID={cid} marked dead in DB; proceeding to call API as requested")
+                            except Exception:
+                                pass
+                            skipped_dead += 1
+                        yield proxy_row, cid, cid not in checked_cids and (checkpoint is None or cid not in checkpoint)
+
+                results = right_search_pipeline(
+                    token_manager.get, jobs(), max_in_flight=self._max_in_flight, should_stop=lambda: self._stop,
+                    cache_ttl=cache_ttl, on_unauthorized=token_manager.refresh,
+                )
+                try:
+                    for proxy_row, cid, resp, error in results:
                         if self._stop:
                             try:
                                 print(f"[SKIP] CID={cid} reason=stop_requested")
@@ -391,13 +632,7 @@ class Patient(QWidget, Patient_ui):
                             self.progress_row.emit(proxy_row)
                         except RuntimeError:
                             break
-                        if is_patient_dead(db_conn, cid):
-                            try:
-                                print(f"[INFO] CID={cid} marked dead in DB; proceeding to call API as requested")
-                            except Exception:
-                                pass
-                            skipped_dead += 1
-                        if (not self._force_recheck) and was_checked_today(db_conn, cid):
+                        if resp is None and error is None:
                             try:
                                 self.mark_checked.emit(proxy_row)
                             except RuntimeError:
@@ -406,9 +641,14 @@ class Patient(QWidget, Patient_ui):
                                 print(f"[SKIP] CID={cid} reason=checked_today")
                             except Exception:
                                 pass
+                            if checkpoint is not None:
+                                checkpoint.mark(cid)
                             skipped_today += 1
                             continue
-                        resp = call_right_search(token, cid)
+                        if error is not None:
+                            print(f"[ERROR] CID={cid} right-search failed: {error}")
+                            failed += 1
+                            continue
                         # For context-menu checks only (debug=True), print CID and response
                         if self._debug:
                             try:
@@ -436,257 +676,38 @@ class Patient(QWidget, Patient_ui):
                                 pass
                             break
                         if resp.status_code == 200:
+                            rec = parse_response(resp)
+                            if rec.error is not None:
+                                print(f"[ERROR] CID={cid} unreadable right-search body: {rec.error}")
+                                failed += 1
+                                continue
                             try:
                                 self.mark_checked.emit(proxy_row)
                             except RuntimeError:
                                 break
-                            try:
-                                data = resp.json()
-                            except Exception:
-                                data = {}
-                            check_date = data.get('checkDate')
-                            funds = data.get('funds', [])
-                            # Robust death date detection (top-level, casing variants, or inside funds[])
-                            death_date = data.get('deathDate') or data.get('deathdate') or data.get('death_date')
-                            if not (isinstance(death_date, str) and death_date.strip()) and isinstance(funds, list):
-                                try:
-                                    for f in funds:
-                                        if isinstance(f, dict):
-                                            dd = f.get('deathDate') or f.get('deathdate') or f.get('death_date')
-                                            if isinstance(dd, str) and dd.strip():
-                                                death_date = dd
-                                                break
-                                except Exception:
-                                    pass
+                            death_date = rec.death_date
                             # If has death info, log BEFORE DB write
-                            try:
-                                if isinstance(death_date, str) and death_date.strip():
-                                    try:
-                                        print(f"[DEBUG] DEATH ALERT CID={cid} deathDate={death_date}")
-                                    except Exception as e:
-                                        traceback.print_exc()
-                            except Exception:
-                                pass
-                            upsert_srm_check(db_conn, cid, check_date, death_date, funds, resp.status_code)
-                            # Determine new pttype values directly from API response with fallbacks to funds[]
-                            new_type = ""
-                            new_no = ""
-                            hospmain_hcode = None
-                            hospsub_hcode = None
-                            begin_date = None
-                            expire_date = None
-                            main_inscl_name = None
-                            sub_inscl_name = None
-                            try:
-                                # Prefer top-level fields if available
-                                subinscl_top = data.get('subinscl') or data.get('subInscl')
-                                cardid_top = data.get('cardId') or data.get('cardID')
-                                if subinscl_top:
-                                    if isinstance(subinscl_top, dict):
-                                        new_type = str(subinscl_top.get('id') or subinscl_top.get('name') or "")
-                                        try:
-                                            sub_inscl_name = sub_inscl_name or str(subinscl_top.get('name') or "")
-                                        except Exception:
-                                            pass
-                                    else:
-                                        new_type = str(subinscl_top)
-                                if cardid_top:
-                                    new_no = str(cardid_top)
+                            if death_date:
+                                print(f"[DEBUG] DEATH ALERT CID={cid} deathDate={death_date}")
+                            # Queue rights for the batched HIS update (applied per chunk in one transaction)
+                            # before srm_check, whose flush writes them first
+                            if self._auto_update and rec.has_rights:
                                 try:
-                                    maininscl_top = data.get('mainInscl') or data.get('maininscl')
-                                    if isinstance(maininscl_top, dict):
-                                        main_inscl_name = main_inscl_name or str(maininscl_top.get('name') or "")
+                                    rights_writer.add(cid, **rec.update_kwargs())
                                 except Exception:
-                                    pass
-                                # Optional top-level hosp codes and dates
-                                try:
-                                    hm_top = data.get('hospMain') or {}
-                                    if isinstance(hm_top, dict):
-                                        hospmain_hcode = hospmain_hcode or hm_top.get('hcode')
-                                    hs_top = data.get('hospSub') or {}
-                                    if isinstance(hs_top, dict):
-                                        hospsub_hcode = hospsub_hcode or hs_top.get('hcode')
-                                    begin_date = begin_date or data.get('startDateTime')
-                                    expire_date = expire_date or data.get('expireDateTime')
-                                except Exception:
-                                    pass
-
-                                # Fallback to first fund entry when top-level missing
-                                if ((not new_type) or (not new_no) or (not main_inscl_name) or (not sub_inscl_name)) and isinstance(funds, list) and funds:
-                                    f0 = funds[0] if isinstance(funds[0], dict) else {}
-                                    if not new_type:
-                                        sub = f0.get('subInscl') if isinstance(f0.get('subInscl'), dict) else None
-                                        if sub:
-                                            new_type = str(sub.get('id') or sub.get('name') or "")
-                                            try:
-                                                sub_inscl_name = sub_inscl_name or str(sub.get('name') or "")
-                                            except Exception as e:
-                                                traceback.print_exc()
-                                    if not new_no:
-                                        new_no = str(f0.get('cardId') or f0.get('cardID') or "")
-                                    # Extract hosp codes and dates from funds[0]
-                                    try:
-                                        main0 = f0.get('mainInscl') if isinstance(f0.get('mainInscl'), dict) else None
-                                        if main0 and not main_inscl_name:
-                                            main_inscl_name = str(main0.get('name') or "")
-                                        hm = f0.get('hospMain') if isinstance(f0.get('hospMain'), dict) else None
-                                        if hm and not hospmain_hcode:
-                                            hospmain_hcode = hm.get('hcode')
-                                        hs = f0.get('hospSub') if isinstance(f0.get('hospSub'), dict) else None
-                                        if hs and not hospsub_hcode:
-                                            hospsub_hcode = hs.get('hcode')
-                                        if not begin_date:
-                                            begin_date = f0.get('startDateTime')
-                                        if not expire_date:
-                                            expire_date = f0.get('expireDateTime')
-                                    except Exception:
-                                        pass
-                            except Exception as e:
-                                traceback.print_exc()
-                                new_type = ""
-                                new_no = ""
-                            # Persist rights back to DB depending on system
-                            try:
-                                if (new_type or new_no):
-                                    with db_conn.cursor() as c_upd:
-                                        if self._auto_update:
-                                            if self._system == 'hosxp':
-                                                # 1) Update person with full fields and DATE() casts for date-only columns
-                                                sql_person = (
-                                                    "UPDATE person SET "
-                                                    "pttype=%s, "
-                                                    "pttype_begin_date=DATE(%s), "
-                                                    "pttype_expire_date=DATE(%s), "
-                                                    "pttype_hospmain=%s, "
-                                                    "pttype_hospsub=%s, "
-                                                    "pttype_no=%s, "
-                                                    "last_update_pttype=NOW() "
-                                                    "WHERE cid=%s"
-                                                )
-                                                params_person = [
-                                                    new_type or None,
-                                                    begin_date or None,
-                                                    expire_date or None,
-                                                    (hospmain_hcode or None),
-                                                    (hospsub_hcode or None),
-                                                    new_no or None,
-                                                    cid,
-                                                ]
-                                                print(f"[SQL UPDATE PERSON] {sql_person}")
-                                                print(f"[SQL PARAMS] {params_person}")
-                                                c_upd.execute(sql_person, params_person)
-                                                affected_rows = c_upd.rowcount
-                                                print(f"[AFFECTED ROWS] Person table: {affected_rows} rows")
-                                                db_conn.commit()
-
-                                                # 2) Update patient (only existing columns) and bump last_update
-                                                sql_patient = (
-                                                    "UPDATE patient SET "
-                                                    "pttype=%s, pttype_no=%s, "
-                                                    "pttype_hospmain=%s, pttype_hospsub=%s, "
-                                                    "last_update=NOW() "
-                                                    "WHERE cid=%s"
-                                                )
-                                                params_patient = [
-                                                    new_type or None,
-                                                    new_no or None,
-                                                    (hospmain_hcode or None),
-                                                    (hospsub_hcode or None),
-                                                    cid,
-                                                ]
-                                                print(f"[SQL UPDATE PATIENT] {sql_patient}")
-                                                print(f"[SQL PARAMS] {params_patient}")
-                                                c_upd.execute(sql_patient, params_patient)
-                                                affected_rows = c_upd.rowcount
-                                                print(f"[AFFECTED ROWS] Patient table: {affected_rows} rows")
-                                                db_conn.commit()
-
-                                                # 3) Update today's ovst joined by patient.cid
-                                                sql_ovst = (
-                                                    "UPDATE ovst o "
-                                                    "JOIN patient p ON p.hn = o.hn "
-                                                    "SET o.pttype=%s, o.pttypeno=%s, o.hospmain=%s, o.hospsub=%s "
-                                                    "WHERE DATE(o.vstdate)=CURDATE() AND p.cid=%s"
-                                                )
-                                                params_ovst = [
-                                                    new_type or None,
-                                                    new_no or None,
-                                                    (hospmain_hcode or None),
-                                                    (hospsub_hcode or None),
-                                                    cid,
-                                                ]
-                                                print(f"[SQL UPDATE OVST] {sql_ovst}")
-                                                print(f"[SQL PARAMS] {params_ovst}")
-                                                c_upd.execute(sql_ovst, params_ovst)
-                                                affected_rows = c_upd.rowcount
-                                                print(f"[AFFECTED ROWS] OVST table: {affected_rows} rows")
-                                                db_conn.commit()
-                                            elif self._system == 'jhcis':
-                                                # Update person rights (JHCIS)
-                                                sets = []
-                                                params = []
-                                                if new_type:
-                                                    sets.append("rightcode=%s"); params.append(new_type)
-                                                if new_no:
-                                                    sets.append("rightno=%s"); params.append(new_no)
-                                                if hospmain_hcode is not None:
-                                                    sets.append("hosmain=%s"); params.append(hospmain_hcode)
-                                                if hospsub_hcode is not None:
-                                                    sets.append("hossub=%s"); params.append(hospsub_hcode)
-                                                if begin_date:
-                                                    sets.append("datestart=DATE(%s)"); params.append(begin_date)
-                                                if expire_date:
-                                                    sets.append("dateexpire=DATE(%s)"); params.append(expire_date)
-                                                if sets:
-                                                    sets.append("dateupdate=NOW()")
-                                                    params.append(cid)
-                                                    sql = "UPDATE person SET " + ", ".join(sets) + " WHERE idcard=%s"
-                                                    print(f"[SQL UPDATE PERSON JHCIS] {sql}")
-                                                    print(f"[SQL PARAMS] {params}")
-                                                    c_upd.execute(sql, params)
-                                                    affected_rows = c_upd.rowcount
-                                                    print(f"[AFFECTED ROWS] Person table (JHCIS): {affected_rows} rows")
-                                                    db_conn.commit()
-
-                                                # Update today's visit by pid (JHCIS)
-                                                try:
-                                                    c_upd.execute("SELECT pid FROM person WHERE idcard=%s LIMIT 1", (cid,))
-                                                    rpid = c_upd.fetchone()
-                                                    if rpid and len(rpid) > 0:
-                                                        pid_val = rpid[0]
-                                                    if pid_val is not None:
-                                                        sql_visit = (
-                                                            "UPDATE visit SET "
-                                                            "rightcode=%s, rightno=%s, hosmain=%s, hossub=%s, "
-                                                            "main_inscl=%s, sub_inscl=%s, dateupdate=NOW() "
-                                                            "WHERE pid=%s AND visitdate=CURDATE()"
-                                                        )
-                                                        params_visit = [
-                                                            (new_type or None),
-                                                            (new_no or None),
-                                                            (hospmain_hcode or None),
-                                                            (hospsub_hcode or None),
-                                                            (main_inscl_name or None),
-                                                            (sub_inscl_name or None),
-                                                            pid_val,
-                                                        ]
-                                                        print(f"[SQL UPDATE VISIT JHCIS] {sql_visit}")
-                                                        print(f"[SQL PARAMS] {params_visit}")
-                                                        c_upd.execute(sql_visit, params_visit)
-                                                        affected_rows = c_upd.rowcount
-                                                        print(f"[AFFECTED ROWS] Visit table (JHCIS): {affected_rows} rows")
-                                                        db_conn.commit()
-                                                except Exception:
-                                                    pass
-                            except Exception:
-                                # fail-soft; continue processing other rows
-                                pass
-                                traceback.print_exc()
+                                    # fail-soft; continue processing other rows
+                                    traceback.print_exc()
+                            check_writer.add(cid, rec.check_date, death_date, rec.funds, resp.status_code)
+                            if checkpoint is not None:
+                                checkpoint.mark(cid)
+                                # Journal only what srm_check (and so the HIS update) already holds
+                                if not len(check_writer):
+                                    checkpoint.commit()
                             try:
-                                self.update_rights.emit(proxy_row, cid, new_type, new_no)
+                                self.update_rights.emit(proxy_row, cid, rec.pttype, rec.pttype_no)
                             except RuntimeError:
                                 pass
-                            if isinstance(death_date, str) and death_date.strip():
+                            if death_date:
                                 try:
                                     self._patient._update_patient_death_from_api(db_conn, cid, death_date)
                                 except Exception as e:
@@ -697,8 +718,19 @@ class Patient(QWidget, Patient_ui):
                             failed += 1
                             continue
                 finally:
+                    results.close()
                     try:
-                        db_conn.close()
+                        # Rights first (via before_flush); a failure leaves srm_check and the journal unwritten
+                        rights_writer.flush()
+                        check_writer.flush()
+                        if checkpoint is not None:
+                            checkpoint.commit()
+                            if not self._stop and not token_expired:
+                                checkpoint.complete()
+                    except Exception:
+                        traceback.print_exc()
+                    try:
+                        pool.release(db_conn)
                     except Exception as e:
                         traceback.print_exc()
                     try:
@@ -716,7 +748,7 @@ class Patient(QWidget, Patient_ui):
         self._pending_force = bool(force)
 
         self._thread = QThread(self)
-        self._worker = RightsWorker(system=system, patient_instance=self, debug=debug, force=force, auto_update=auto_update)
+        self._worker = RightsWorker(system=system, patient_instance=self, debug=debug, force=force, auto_update=auto_update, max_in_flight=max_in_flight)
         self._worker.moveToThread(self._thread)
         self._thread.started.connect(self._worker.run)
 
@@ -736,31 +768,16 @@ class Patient(QWidget, Patient_ui):
 
         def on_mark_checked(proxy_row: int):
             chk_idx = self.proxy.mapToSource(self.proxy.index(proxy_row, 0))
-            item = self.proxy.sourceModel().item(chk_idx.row(), 0)
-            if item and item.isCheckable():
-                item.setCheckState(Qt.CheckState.Checked)
+            self.source_model.set_checked(chk_idx.row())
 
         def on_update_rights(proxy_row: int, cid: str, pttype_new: str, pttype_no_new: str):
             try:
-                # Find current proxy rows that match this CID to avoid stale proxy_row issues
-                rows_to_update = []
-                for r in range(self.proxy.rowCount()):
-                    idx = self.proxy.index(r, self.cid_col)
-                    if str(idx.data()) == str(cid):
-                        rows_to_update.append(r)
-                if not rows_to_update:
-                    rows_to_update = [proxy_row]
-                for pr in rows_to_update:
-                    if getattr(self, 'pttype_new_col', -1) >= 0:
-                        src_idx_type = self.proxy.mapToSource(self.proxy.index(pr, self.pttype_new_col))
-                        item_type = self.proxy.sourceModel().item(src_idx_type.row(), self.pttype_new_col)
-                        if item_type:
-                            item_type.setText(pttype_new or "")
-                    if getattr(self, 'pttype_no_new_col', -1) >= 0:
-                        src_idx_no = self.proxy.mapToSource(self.proxy.index(pr, self.pttype_no_new_col))
-                        item_no = self.proxy.sourceModel().item(src_idx_no.row(), self.pttype_no_new_col)
-                        if item_no:
-                            item_no.setText(pttype_no_new or "")
+                # Look up source rows by CID to avoid stale proxy_row issues
+                src_rows = self.source_model.rows_for_cid(cid)
+                if not src_rows:
+                    src_rows = [self.proxy.mapToSource(self.proxy.index(proxy_row, 0)).row()]
+                for sr in src_rows:
+                    self.source_model.set_new_rights(sr, pttype_new, pttype_no_new)
             except Exception:
                 pass
 
@@ -773,7 +790,19 @@ class Patient(QWidget, Patient_ui):
                 f"สำเร็จ: {succeeded}",
                 f"ล้มเหลว: {failed}",
             ]
+            try:
+                cs = response_cache.stats()
+                summary_lines.append(f"ใช้ผลจากแคช (ไม่เรียก API): {cs['hits']} / เรียก API: {cs['misses']}")
+            except Exception as e:
+                traceback.print_exc()
             summary_text = "\n".join(summary_lines)
+            try:
+                st = http_stats()
+                print(f"[HTTP] requests={st['requests']} connections={st['connections']} reused={st['reused']}")
+                cs = response_cache.stats()
+                print(f"[SRM CACHE] hits={cs['hits']} misses={cs['misses']} size={cs['size']}")
+            except Exception as e:
+                traceback.print_exc()
             if token_expired:
                 try:
                     self._show_status("Token หมดอายุ กำลังรีเฟรชโทเคนอัตโนมัติ...", 7000)
@@ -898,6 +927,18 @@ class Patient(QWidget, Patient_ui):
             if val:
                 rows.append((row, str(val)))
 
+        # Durable journal keyed by the full CID list: a restarted sweep skips finished CIDs
+        try:
+            system = str(self.settings.value("system", "jhcis")).strip().lower()
+            self._checkpoint = SweepCheckpoint.open(
+                [cid for _, cid in rows], scope=roster_target(self._get_db_config(), system)
+            )
+            if self._checkpoint.done:
+                print(f"[CHECKPOINT] resuming sweep {self._checkpoint.sweep_id[:12]} done={len(self._checkpoint.done)}/{self._checkpoint.total}")
+        except Exception as e:
+            traceback.print_exc()
+            self._checkpoint = None
+
         # Determine resume position if any (continue from where stopped)
         start_from = getattr(self, '_resume_from', 0)
         if isinstance(start_from, int) and start_from > 0:
@@ -927,6 +968,17 @@ class Patient(QWidget, Patient_ui):
             pass
 
     def _stop_worker(self):
+        if getattr(self, '_load_worker', None) is not None:
+            try:
+                self._load_worker.request_stop()
+            except Exception:
+                pass
+        if getattr(self, '_load_thread', None) is not None:
+            try:
+                self._load_thread.quit()
+                self._load_thread.wait(3000)
+            except Exception:
+                pass
         if hasattr(self, '_worker') and self._worker is not None:
             try:
                 self._worker.request_stop()
@@ -939,19 +991,94 @@ class Patient(QWidget, Patient_ui):
             except Exception:
                 pass
 
+    def _start_index_worker(self, worker: IndexAdvisorWorker) -> None:
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+
+        def on_finished(_failed: list):
+            thread.quit()
+            thread.wait()
+            try:
+                worker.deleteLater()
+                thread.deleteLater()
+            except Exception:
+                pass
+            self._index_workers.discard(worker)
+
+        worker.finished.connect(on_finished)
+        # Keep a Python reference until the thread is done
+        if not hasattr(self, '_index_workers'):
+            self._index_workers = set()
+        self._index_workers.add(worker)
+        thread.start()
+
+    def _advise_indexes(self):
+        """Check supporting indexes once per DB target and offer to create the missing ones."""
+        try:
+            cfg = self._get_db_config()
+            if not str(cfg.get("host", "")).strip() or not str(cfg.get("database", "")).strip():
+                return
+            skip_key = f"index_advisor_skip/{cfg['host']}:{cfg['port']}/{cfg['database']}"
+            if str(self.settings.value(skip_key, "false")).lower() in ("1", "true"):
+                return
+            system = str(self.settings.value("system", "jhcis")).strip().lower()
+            # Probe in the background; only the prompt runs on the GUI thread
+            probe = IndexAdvisorWorker(cfg, system)
+            probe.missing_found.connect(lambda missing: self._offer_indexes(cfg, system, skip_key, missing))
+            self._start_index_worker(probe)
+        except Exception as e:
+            traceback.print_exc()
+
+    def _offer_indexes(self, cfg: dict, system: str, skip_key: str, missing: list):
+        try:
+            if not missing:
+                return
+            lines = "\n".join(f"- {t}({c})" for t, c, _ in missing)
+            box = QMessageBox(self)
+            box.setIcon(QMessageBox.Icon.Question)
+            box.setWindowTitle("แนะนำดัชนีฐานข้อมูล")
+            box.setText(f"ไม่พบดัชนีที่ช่วยให้การตรวจสอบสิทธิเร็วขึ้น:\n{lines}\n\nต้องการสร้างดัชนีเหล่านี้หรือไม่?")
+            box.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            chk = QCheckBox("ไม่ต้องถามอีก")
+            box.setCheckBox(chk)
+            answer = box.exec()
+            if chk.isChecked():
+                self.settings.setValue(skip_key, True)
+            if answer != QMessageBox.StandardButton.Yes:
+                return
+            dlg = QProgressDialog("กำลังสร้างดัชนี...", "", 0, len(missing), self)
+            dlg.setWindowTitle("กำลังสร้างดัชนี")
+            dlg.setCancelButton(None)
+            dlg.setWindowModality(Qt.WindowModality.WindowModal)
+            dlg.setMinimumDuration(0)
+            dlg.show()
+
+            def on_progress(done: int, label: str):
+                dlg.setValue(done)
+                if label:
+                    dlg.setLabelText(f"กำลังสร้างดัชนี {label}...")
+
+            def on_finished(failed: list):
+                dlg.close()
+                if failed:
+                    QMessageBox.warning(self, "สร้างดัชนีไม่สำเร็จ", "\n".join(failed))
+                else:
+                    self._show_status(f"สร้างดัชนีแล้ว {len(missing)} รายการ")
+
+            worker = IndexAdvisorWorker(cfg, system, create=missing)
+            worker.progress.connect(on_progress)
+            worker.finished.connect(on_finished)
+            self._start_index_worker(worker)
+        except Exception as e:
+            traceback.print_exc()
+
     # --- DB helpers for death update ---
     def _column_exists(self, conn, table: str, column: str) -> bool:
         try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
-                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s
-                    """,
-                    (table, column),
-                )
-                return cur.fetchone() is not None
+            return column_exists(conn, table, column)
         except Exception:
+            traceback.print_exc()
             return False
 
     def _update_patient_death_from_api(self, conn, cid: str, death_date: str):
@@ -989,48 +1116,29 @@ class Patient(QWidget, Patient_ui):
     def _mark_checked_today_in_view(self):
         # Batch query srm_check for today's checked CIDs and tick the checkbox in column 0
         try:
-            row_count = self.proxy.rowCount()
-            if row_count == 0:
+            model = getattr(self, 'source_model', None)
+            if model is None or model.rowCount() == 0:
                 return
-            # Collect CIDs and map cid -> list of proxy rows
-            cid_rows = {}
-            for r in range(row_count):
-                idx = self.proxy.index(r, self.cid_col)
-                cid = idx.data()
-                if cid:
-                    cid_rows.setdefault(str(cid), []).append(r)
-            if not cid_rows:
+            cids = model.cids()
+            if not cids:
                 return
             # Query in batches
-            import pymysql
-            cfg = self._get_db_config()
-            conn = pymysql.connect(**cfg)
-            ensure_srm_check_table(conn)
             checked_today = set()
-            cids = list(cid_rows.keys())
             B = 500
-            with conn.cursor() as cur:
-                for i in range(0, len(cids), B):
-                    chunk = cids[i:i+B]
-                    placeholders = ",".join(["%s"] * len(chunk))
-                    sql = f"SELECT cid FROM srm_check WHERE DATE(check_date)=CURDATE() AND cid IN ({placeholders})"
-                    cur.execute(sql, chunk)
-                    for row in cur.fetchall() or []:
-                        checked_today.add(str(row[0]))
-            try:
-                conn.close()
-            except Exception:
-                pass
+            with self._db_pool().connection() as conn:
+                ensure_srm_check_table(conn)
+                with conn.cursor() as cur:
+                    for i in range(0, len(cids), B):
+                        chunk = cids[i:i+B]
+                        placeholders = ",".join(["%s"] * len(chunk))
+                        sql = f"SELECT cid FROM srm_check WHERE {day_range_sql('check_date')} AND cid IN ({placeholders})"
+                        cur.execute(sql, chunk)
+                        for row in cur.fetchall() or []:
+                            checked_today.add(str(row[0]))
             if not checked_today:
                 return
             # Tick checkboxes for matched rows
-            for cid, proxy_rows in cid_rows.items():
-                if cid in checked_today:
-                    for pr in proxy_rows:
-                        chk_idx = self.proxy.mapToSource(self.proxy.index(pr, 0))
-                        item = self.proxy.sourceModel().item(chk_idx.row(), 0)
-                        if item and item.isCheckable():
-                            item.setCheckState(Qt.CheckState.Checked)
+            model.set_checked_cids(checked_today)
         except Exception:
             # Fail silently to avoid blocking UI
             pass
@@ -1,26 +1,46 @@
 import sys
 import traceback
 from PyQt6.QtWidgets import QWidget, QApplication, QMessageBox, QMenu, QAbstractItemView, QInputDialog
-from PyQt6.QtGui import QStandardItemModel, QStandardItem, QGuiApplication
-from PyQt6.QtCore import QDate, QLocale, Qt, QObject, QThread, pyqtSignal, QSortFilterProxyModel, QTimer, QCoreApplication, QRegularExpression
+from PyQt6.QtGui import QGuiApplication
+from PyQt6.QtCore import QSettings, QDate, QLocale, Qt, QObject, QThread, pyqtSignal, QSortFilterProxyModel, QTimer, QCoreApplication, QRegularExpression
 from srm import (
     read_token,
     ensure_srm_check_table,
     upsert_srm_check,
-    call_right_search,
-    was_checked_today,
-    is_patient_dead,
+    SrmCheckWriter,
+    RightsUpdateWriter,
+    cached_right_search,
+    right_search_pipeline,
+    response_cache,
+    cache_ttl_from_settings,
+    token_manager,
+    load_checked_cids,
+    load_dead_cids,
     refresh_token,
     open_srm_program,
+    configure_http_from_settings,
+    http_stats,
+    day_range_sql,
 )
 
 from PatientToday_ui import PatientToday_ui
+from DbPool import get_pool
+from RightsParser import parse_response
+from RightsTableModel import RightsTableModel
+from RosterCache import roster_target
+from SweepCheckpoint import SweepCheckpoint
 
 
 class PatientToday(QWidget, PatientToday_ui):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setupUi(self)
+        self.settings = QSettings("SRM_API", "MySQL_Settings")
+
+        try:
+            configure_http_from_settings(self.settings)
+        except Exception as e:
+            traceback.print_exc()
 
         # Initialize date picker to today and wire change handler
         try:
@@ -91,13 +111,16 @@ class PatientToday(QWidget, PatientToday_ui):
             "connect_timeout": int(settings.value("timeout", 10)),
         }
 
+    def _db_pool(self):
+        from PyQt6.QtCore import QSettings
+        return get_pool(self._get_db_config(), QSettings("SRM_API", "MySQL_Settings"))
+
     def _get_system(self) -> str:
         from PyQt6.QtCore import QSettings
         settings = QSettings("SRM_API", "MySQL_Settings")
         return str(settings.value("system", "jhcis")).strip().lower()
 
     def _load_for_date(self, qdate: QDate):
-        import pymysql
         cfg = self._get_db_config()
         if not str(cfg.get("host", "")).strip() or not str(cfg.get("user", "")).strip() or not str(cfg.get("database", "")).strip():
             raise ValueError("โปรดตั้งค่าการเชื่อมต่อฐานข้อมูลให้ครบถ้วนในเมนู ตั้งค่า")
@@ -107,7 +130,7 @@ class PatientToday(QWidget, PatientToday_ui):
 
         if system == 'hosxp':
             sql = (
-                """
+                f"""
                 SELECT 
                     p.cid,
                     p.pname,
@@ -118,11 +141,11 @@ class PatientToday(QWidget, PatientToday_ui):
                     p.last_update AS last_update_right
                 FROM ovst o
                 JOIN patient p ON p.hn = o.hn
-                WHERE DATE(o.vstdate) = %s
+                WHERE {day_range_sql('o.vstdate', '%s')}
                 ORDER BY o.vn
                 """
             )
-            params = (date_str,)
+            params = (date_str, date_str)
         else:
             # JHCIS: list by visit table
             sql = (
@@ -146,37 +169,13 @@ class PatientToday(QWidget, PatientToday_ui):
 
         rows = []
         headers = ["cid", "pname", "fname", "lname", "pttype", "pttype_no", "last_update_right"]
-        conn = pymysql.connect(**cfg)
-        try:
+        with self._db_pool().connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql, params)
                 rows = cur.fetchall() or []
-        finally:
-            try:
-                conn.close()
-            except Exception as e:
-                traceback.print_exc()
         # Populate table model with fetched rows, matching Patient headers
         headers_with_check = ["check"] + headers + ["pttype_new", "pttype_no_new"]
-        model = QStandardItemModel()
-        model.setColumnCount(len(headers_with_check))
-        model.setHorizontalHeaderLabels(headers_with_check)
-        for r in rows:
-            items = []
-            chk = QStandardItem()
-            chk.setCheckable(True)
-            chk.setCheckState(Qt.CheckState.Unchecked)
-            chk.setEditable(False)
-            items.append(chk)
-            for val in r:
-                text = "" if val is None else str(val)
-                it = QStandardItem(text)
-                it.setEditable(False)
-                items.append(it)
-            # placeholders for new columns
-            items.append(QStandardItem(""))
-            items.append(QStandardItem(""))
-            model.appendRow(items)
+        model = RightsTableModel(headers, rows, self)
         # Assign via proxy to mirror Patient filtering/sorting behavior
         self.source_model = model
         self.proxy = QSortFilterProxyModel(self)
@@ -267,8 +266,7 @@ class PatientToday(QWidget, PatientToday_ui):
                 # Normal flow: pass 1 collect checked rows (manual selection), else process all
                 for pr in range(rc):
                     src_row = self.proxy.mapToSource(self.proxy.index(pr, 0)).row()
-                    item = self.proxy.sourceModel().item(src_row, 0)
-                    if item and item.isCheckable() and item.checkState() == Qt.CheckState.Checked:
+                    if self.source_model.is_checked(src_row):
                         cid_val = self.proxy.index(pr, self.cid_col).data()
                         if cid_val:
                             rows.append((pr, str(cid_val)))
@@ -282,6 +280,17 @@ class PatientToday(QWidget, PatientToday_ui):
         if not rows:
             QMessageBox.information(self, 'ไม่มีข้อมูล', 'ไม่มีข้อมูลสำหรับตรวจสอบสิทธิ')
             return
+        # Durable journal for this date's sweep; an in-session resume keeps the current one
+        if int(getattr(self, '_resume_from', 0) or 0) <= 0 or getattr(self, '_checkpoint', None) is None:
+            try:
+                date_str = self.date_edit.date().toString('yyyy-MM-dd')
+                scope = f"{roster_target(self._get_db_config(), self._get_system())}#{date_str}"
+                self._checkpoint = SweepCheckpoint.open([cid for _, cid in rows], scope=scope)
+                if self._checkpoint.done:
+                    print(f"[CHECKPOINT] resuming sweep {self._checkpoint.sweep_id[:12]} done={len(self._checkpoint.done)}/{self._checkpoint.total}")
+            except Exception:
+                traceback.print_exc()
+                self._checkpoint = None
         self._start_rights_worker(rows, debug=False, force=False)
 
     def _start_rights_worker(self, rows: list[tuple], debug: bool = False, force: bool = False):
@@ -291,14 +300,19 @@ class PatientToday(QWidget, PatientToday_ui):
             return
         try:
             token = read_token()
+            # Share the file's token with the manager and keep it fresh ahead of expiry
+            token_manager.set(token)
+            token_manager.start_auto_refresh()
         except Exception as e:
             traceback.print_exc()
             self._show_status('การขอ token ใหม่เกิดข้อผิดพลาด', 7000)
             return
-        cfg = self._get_db_config()
+        pool = self._db_pool()
         system = self._get_system()
         date_str = self.date_edit.date().toString('yyyy-MM-dd')
         auto_update = getattr(self, 'auto_update_checkbox', None) and self.auto_update_checkbox.isChecked()
+        cache_ttl = cache_ttl_from_settings(self.settings, "single" if force else "sweep")
+        checkpoint = None if force else getattr(self, '_checkpoint', None)
 
         class RightsWorker(QObject):
             progress_row = pyqtSignal(int)
@@ -316,21 +330,45 @@ class PatientToday(QWidget, PatientToday_ui):
                 self._auto_update = bool(auto_update)
             def request_stop(self):
                 self._stop = True
-            def _checked_on_date(self, conn, cid: str) -> bool:
-                try:
-                    with conn.cursor() as c:
-                        c.execute("SELECT 1 FROM srm_check WHERE cid=%s AND DATE(check_date)=%s LIMIT 1", (cid, self._date))
-                        r = c.fetchone()
-                        return bool(r)
-                except Exception:
-                    return False
             def run(self):
-                import pymysql, json
-                db_conn = pymysql.connect(**cfg)
+                import json
+                db_conn = pool.acquire()
                 ensure_srm_check_table(db_conn)
+                # Buffer srm_check results; flushed in batches and always in finally
+                rights_writer = RightsUpdateWriter(db_conn, self._system, visit_date=self._date)
+                # Queued HIS updates are written before the srm_check rows that follow them
+                check_writer = SrmCheckWriter(db_conn, before_flush=rights_writer.flush)
                 skipped_today = 0; skipped_dead = 0; succeeded = 0; failed = 0; token_expired = False
+                # Pre-flight: fetch the date's checked set and the dead set once instead of per CID
+                dead_cids = load_dead_cids(db_conn)
+                checked_cids = set()
+                if not self._force_recheck:
+                    try:
+                        checked_cids = load_checked_cids(db_conn, self._date)
+                    except Exception:
+                        traceback.print_exc()
                 try:
+                    response_cache.preload(db_conn, cache_ttl)
+                except Exception:
+                    traceback.print_exc()
+
+                def jobs():
+                    nonlocal skipped_dead
                     for proxy_row, cid in rows:
+                        # dead info (log only)
+                        if cid in dead_cids:
+                            print(f"[INFO] CID={cid} marked dead in DB; proceeding to call API as requested")
+                            skipped_dead += 1
+                        # skip if already checked in selected date unless force
+                        yield proxy_row, cid, cid not in checked_cids and (checkpoint is None or cid not in checkpoint)
+
+                # One CID at a time, but with the pipeline's 401 refresh, 429/5xx retries and rate limiter
+                results = right_search_pipeline(
+                    token_manager.get, jobs(), max_in_flight=1, should_stop=lambda: self._stop,
+                    cache_ttl=cache_ttl, on_unauthorized=token_manager.refresh,
+                )
+                try:
+                    for proxy_row, cid, resp, error in results:
                         if self._stop:
                             try:
                                 print(f"[SKIP] CID={cid} reason=stop_requested")
@@ -341,23 +379,20 @@ class PatientToday(QWidget, PatientToday_ui):
                             self.progress_row.emit(proxy_row)
                         except RuntimeError:
                             break
-                        # dead info (log only)
-                        try:
-                            if is_patient_dead(db_conn, cid):
-                                print(f"[INFO] CID={cid} marked dead in DB; proceeding to call API as requested")
-                                skipped_dead += 1
-                        except Exception:
-                            pass
-                        # skip if already checked in selected date unless force
-                        if (not self._force_recheck) and self._checked_on_date(db_conn, cid):
+                        if resp is None and error is None:
                             try:
                                 self.mark_checked.emit(proxy_row)
                                 print(f"[SKIP] CID={cid} reason=checked_on_date")
                             except Exception:
                                 pass
+                            if checkpoint is not None:
+                                checkpoint.mark(cid)
                             skipped_today += 1
                             continue
-                        resp = call_right_search(token, cid)
+                        if error is not None:
+                            print(f"[ERROR] CID={cid} right-search failed: {error}")
+                            failed += 1
+                            continue
                         if self._debug:
                             try:
                                 body_text = json.dumps(resp.json(), ensure_ascii=False)
@@ -380,128 +415,30 @@ class PatientToday(QWidget, PatientToday_ui):
                                 pass
                             break
                         if resp.status_code == 200:
+                            rec = parse_response(resp)
+                            if rec.error is not None:
+                                print(f"[ERROR] CID={cid} unreadable right-search body: {rec.error}")
+                                failed += 1
+                                continue
                             try:
                                 self.mark_checked.emit(proxy_row)
                             except RuntimeError:
                                 break
+                            # persist back (batched per chunk, see RightsUpdateWriter) before srm_check,
+                            # whose flush writes the queued rights first
                             try:
-                                data = resp.json()
-                            except Exception:
-                                data = {}
-                            check_date = data.get('checkDate')
-                            funds = data.get('funds', [])
-                            upsert_srm_check(db_conn, cid, check_date, None, funds, resp.status_code)
-                            # extract minimal
-                            new_type = ""; new_no = ""; hospmain_hcode=None; hospsub_hcode=None; begin_date=None; expire_date=None; main_inscl_name=None; sub_inscl_name=None
-                            try:
-                                subinscl_top = data.get('subinscl') or data.get('subInscl')
-                                cardid_top = data.get('cardId') or data.get('cardID')
-                                if isinstance(subinscl_top, dict):
-                                    new_type = str(subinscl_top.get('id') or subinscl_top.get('name') or "")
-                                    sub_inscl_name = str(subinscl_top.get('name') or "")
-                                elif subinscl_top:
-                                    new_type = str(subinscl_top)
-                                if cardid_top:
-                                    new_no = str(cardid_top)
-                                hm_top = data.get('hospMain') or {}
-                                if isinstance(hm_top, dict):
-                                    hospmain_hcode = hm_top.get('hcode')
-                                hs_top = data.get('hospSub') or {}
-                                if isinstance(hs_top, dict):
-                                    hospsub_hcode = hs_top.get('hcode')
-                                begin_date = data.get('startDateTime')
-                                expire_date = data.get('expireDateTime')
-                                if ((not new_type) or (not new_no) or (not sub_inscl_name)) and isinstance(funds, list) and funds:
-                                    f0 = funds[0] if isinstance(funds[0], dict) else {}
-                                    if not new_type:
-                                        sub = f0.get('subInscl') if isinstance(f0.get('subInscl'), dict) else None
-                                        if sub:
-                                            new_type = str(sub.get('id') or sub.get('name') or "")
-                                            sub_inscl_name = sub_inscl_name or str(sub.get('name') or "")
-                                    if not new_no:
-                                        new_no = str(f0.get('cardId') or f0.get('cardID') or "")
-                                    main0 = f0.get('mainInscl') if isinstance(f0.get('mainInscl'), dict) else None
-                                    if main0 and not main_inscl_name:
-                                        main_inscl_name = str(main0.get('name') or "")
-                                    hm = f0.get('hospMain') if isinstance(f0.get('hospMain'), dict) else None
-                                    if hm and not hospmain_hcode:
-                                        hospmain_hcode = hm.get('hcode')
-                                    hs = f0.get('hospSub') if isinstance(f0.get('hospSub'), dict) else None
-                                    if hs and not hospsub_hcode:
-                                        hospsub_hcode = hs.get('hcode')
-                            except Exception:
-                                pass
-                            # persist back
-                            try:
-                                with db_conn.cursor() as c_upd:
-                                    if self._auto_update:
-                                        if self._system == 'hosxp':
-                                            sql_person = (
-                                                "UPDATE person SET pttype=%s, pttype_begin_date=DATE(%s), pttype_expire_date=DATE(%s), pttype_hospmain=%s, pttype_hospsub=%s, pttype_no=%s, last_update_pttype=NOW() WHERE cid=%s"
-                                            )
-                                            params_person = [new_type or None, begin_date or None, expire_date or None, hospmain_hcode or None, hospsub_hcode or None, new_no or None, cid]
-                                            print(f"[SQL UPDATE PERSON] {sql_person}")
-                                            print(f"[SQL PARAMS] {params_person}")
-                                            c_upd.execute(sql_person, params_person)
-                                            affected_rows = c_upd.rowcount
-                                            print(f"[AFFECTED ROWS] Person table: {affected_rows} rows")
-                                            
-                                            sql_patient = (
-                                                "UPDATE patient SET pttype=%s, pttype_no=%s, pttype_hospmain=%s, pttype_hospsub=%s, last_update=NOW() WHERE cid=%s"
-                                            )
-                                            params_patient = [new_type or None, new_no or None, hospmain_hcode or None, hospsub_hcode or None, cid]
-                                            print(f"[SQL UPDATE PATIENT] {sql_patient}")
-                                            print(f"[SQL PARAMS] {params_patient}")
-                                            c_upd.execute(sql_patient, params_patient)
-                                            affected_rows = c_upd.rowcount
-                                            print(f"[AFFECTED ROWS] Patient table: {affected_rows} rows")
-                                            
-                                            sql_ovst = (
-                                                "UPDATE ovst o JOIN patient p ON p.hn = o.hn SET o.pttype=%s, o.pttypeno=%s, o.hospmain=%s, o.hospsub=%s WHERE DATE(o.vstdate)=%s AND p.cid=%s"
-                                            )
-                                            params_ovst = [new_type or None, new_no or None, hospmain_hcode or None, hospsub_hcode or None, self._date, cid]
-                                            print(f"[SQL UPDATE OVST] {sql_ovst}")
-                                            print(f"[SQL PARAMS] {params_ovst}")
-                                            c_upd.execute(sql_ovst, params_ovst)
-                                            affected_rows = c_upd.rowcount
-                                            print(f"[AFFECTED ROWS] OVST table: {affected_rows} rows")
-                                        else:
-                                            sets = []; params = []
-                                            if new_type: sets.append("rightcode=%s"); params.append(new_type)
-                                            if new_no: sets.append("rightno=%s"); params.append(new_no)
-                                            if hospmain_hcode is not None: sets.append("hosmain=%s"); params.append(hospmain_hcode)
-                                            if hospsub_hcode is not None: sets.append("hossub=%s"); params.append(hospsub_hcode)
-                                            if begin_date: sets.append("datestart=DATE(%s)"); params.append(begin_date)
-                                            if expire_date: sets.append("dateexpire=DATE(%s)"); params.append(expire_date)
-                                            if sets:
-                                                sets.append("dateupdate=NOW()"); params.append(cid)
-                                                sql_person = "UPDATE person SET " + ", ".join(sets) + " WHERE idcard=%s"
-                                                print(f"[SQL UPDATE PERSON JHCIS] {sql_person}")
-                                                print(f"[SQL PARAMS] {params}")
-                                                c_upd.execute(sql_person, params)
-                                                affected_rows = c_upd.rowcount
-                                                print(f"[AFFECTED ROWS] Person table (JHCIS): {affected_rows} rows")
-                                            # selected date's visit
-                                            pid_val = None
-                                            c_upd.execute("SELECT pid FROM person WHERE idcard=%s LIMIT 1", (cid,))
-                                            rpid = c_upd.fetchone()
-                                            if rpid and len(rpid) > 0:
-                                                pid_val = rpid[0]
-                                            if pid_val is not None:
-                                                sql_visit = (
-                                                    "UPDATE visit SET rightcode=%s, rightno=%s, hosmain=%s, hossub=%s, main_inscl=%s, sub_inscl=%s, dateupdate=NOW() WHERE pid=%s AND visitdate=%s"
-                                                )
-                                                params_visit = [new_type or None, new_no or None, hospmain_hcode or None, hospsub_hcode or None, main_inscl_name or None, sub_inscl_name or None, pid_val, self._date]
-                                                print(f"[SQL UPDATE VISIT JHCIS] {sql_visit}")
-                                                print(f"[SQL PARAMS] {params_visit}")
-                                                c_upd.execute(sql_visit, params_visit)
-                                                affected_rows = c_upd.rowcount
-                                                print(f"[AFFECTED ROWS] Visit table (JHCIS): {affected_rows} rows")
-                                db_conn.commit()
+                                if self._auto_update:
+                                    rights_writer.add(cid, **rec.update_kwargs())
                             except Exception:
                                 traceback.print_exc()
+                            check_writer.add(cid, rec.check_date, rec.death_date, rec.funds, resp.status_code)
+                            if checkpoint is not None:
+                                checkpoint.mark(cid)
+                                # Journal only what srm_check (and so the HIS update) already holds
+                                if not len(check_writer):
+                                    checkpoint.commit()
                             try:
-                                self.update_rights.emit(proxy_row, cid, new_type, new_no)
+                                self.update_rights.emit(proxy_row, cid, rec.pttype, rec.pttype_no)
                             except RuntimeError:
                                 pass
                             succeeded += 1
@@ -509,8 +446,19 @@ class PatientToday(QWidget, PatientToday_ui):
                             failed += 1
                             continue
                 finally:
+                    results.close()
+                    try:
+                        # Rights first (via before_flush); a failure leaves srm_check and the journal unwritten
+                        rights_writer.flush()
+                        check_writer.flush()
+                        if checkpoint is not None:
+                            checkpoint.commit()
+                            if not self._stop and not token_expired:
+                                checkpoint.complete()
+                    except Exception:
+                        traceback.print_exc()
                     try:
-                        db_conn.close()
+                        pool.release(db_conn)
                     except Exception:
                         traceback.print_exc()
                     try:
@@ -543,35 +491,27 @@ class PatientToday(QWidget, PatientToday_ui):
 
         def on_mark_checked(proxy_row: int):
             chk_idx = self.proxy.mapToSource(self.proxy.index(proxy_row, 0))
-            item = self.proxy.sourceModel().item(chk_idx.row(), 0)
-            if item and item.isCheckable():
-                item.setCheckState(Qt.CheckState.Checked)
+            self.source_model.set_checked(chk_idx.row())
 
         def on_update_rights(proxy_row: int, cid: str, pttype_new: str, pttype_no_new: str):
             try:
-                rows_to_update = []
-                for r in range(self.proxy.rowCount()):
-                    idx = self.proxy.index(r, self.cid_col)
-                    if str(idx.data()) == str(cid):
-                        rows_to_update.append(r)
-                if not rows_to_update:
-                    rows_to_update = [proxy_row]
-                for pr in rows_to_update:
-                    if getattr(self, 'pttype_new_col', -1) >= 0:
-                        src_idx_type = self.proxy.mapToSource(self.proxy.index(pr, self.pttype_new_col))
-                        item_type = self.proxy.sourceModel().item(src_idx_type.row(), self.pttype_new_col)
-                        if item_type:
-                            item_type.setText(pttype_new or "")
-                    if getattr(self, 'pttype_no_new_col', -1) >= 0:
-                        src_idx_no = self.proxy.mapToSource(self.proxy.index(pr, self.pttype_no_new_col))
-                        item_no = self.proxy.sourceModel().item(src_idx_no.row(), self.pttype_no_new_col)
-                        if item_no:
-                            item_no.setText(pttype_no_new or "")
+                src_rows = self.source_model.rows_for_cid(cid)
+                if not src_rows:
+                    src_rows = [self.proxy.mapToSource(self.proxy.index(proxy_row, 0)).row()]
+                for sr in src_rows:
+                    self.source_model.set_new_rights(sr, pttype_new, pttype_no_new)
             except Exception:
                 pass
 
         def on_finished_summary(skipped_today: int, skipped_dead: int, succeeded: int, failed: int, token_expired: bool):
             total_rows = self.proxy.rowCount()
+            try:
+                st = http_stats()
+                print(f"[HTTP] requests={st['requests']} connections={st['connections']} reused={st['reused']}")
+                cs = response_cache.stats()
+                print(f"[SRM CACHE] hits={cs['hits']} misses={cs['misses']} size={cs['size']}")
+            except Exception as e:
+                traceback.print_exc()
             if token_expired:
                 try:
                     self._show_status("Token หมดอายุ กำลังรีเฟรชโทเคนอัตโนมัติ...", 7000)
@@ -731,8 +671,7 @@ class PatientToday(QWidget, PatientToday_ui):
 
     def _check_and_update_rights(self, cid: str):
         """Call SRM for given CID and update rights in DB for selected date."""
-        import pymysql
-        cfg = self._get_db_config()
+        pool = self._db_pool()
         qdate = self.date_edit.date()
         date_str = qdate.toString("yyyy-MM-dd")
         system = self._get_system()
@@ -743,53 +682,26 @@ class PatientToday(QWidget, PatientToday_ui):
             QMessageBox.warning(self, "โทเคนไม่พร้อม", str(e))
             return
         try:
-            conn = pymysql.connect(**cfg)
+            conn = pool.acquire()
         except Exception as e:
             QMessageBox.critical(self, "เชื่อมต่อฐานข้อมูลล้มเหลว", str(e))
             return
         try:
             ensure_srm_check_table(conn)
-            resp = call_right_search(token, cid)
+            resp = cached_right_search(token, cid, cache_ttl_from_settings(self.settings, "single"))
             if resp.status_code != 200:
                 QMessageBox.warning(self, "ตรวจสิทธิไม่สำเร็จ", f"HTTP {resp.status_code}")
                 return
-            try:
-                data = resp.json()
-            except Exception:
-                data = {}
-            check_date = data.get('checkDate')
-            funds = data.get('funds', [])
-            # Extract rights
-            new_type = ""
-            new_no = ""
-            hospmain_hcode = None
-            hospsub_hcode = None
-            begin_date = None
-            expire_date = None
-            main_inscl_name = None
-            sub_inscl_name = None
-            try:
-                f0 = funds[0] if isinstance(funds, list) and funds and isinstance(funds[0], dict) else {}
-                sub = f0.get('subInscl') if isinstance(f0.get('subInscl'), dict) else None
-                if sub:
-                    new_type = str(sub.get('id') or sub.get('name') or "")
-                    sub_inscl_name = str(sub.get('name') or "")
-                new_no = str(f0.get('cardId') or f0.get('cardID') or "")
-                main0 = f0.get('mainInscl') if isinstance(f0.get('mainInscl'), dict) else None
-                if main0:
-                    main_inscl_name = str(main0.get('name') or "")
-                hm = f0.get('hospMain') if isinstance(f0.get('hospMain'), dict) else None
-                if hm:
-                    hospmain_hcode = hm.get('hcode')
-                hs = f0.get('hospSub') if isinstance(f0.get('hospSub'), dict) else None
-                if hs:
-                    hospsub_hcode = hs.get('hcode')
-                begin_date = f0.get('startDateTime')
-                expire_date = f0.get('expireDateTime')
-            except Exception:
-                pass
+            rec = parse_response(resp)
+            if rec.error is not None:
+                QMessageBox.warning(self, "ตรวจสิทธิไม่สำเร็จ", f"อ่านผลตรวจสิทธิไม่ได้: {rec.error}")
+                return
+            new_type, new_no = rec.pttype, rec.pttype_no
+            hospmain_hcode, hospsub_hcode = rec.hospmain, rec.hospsub
+            begin_date, expire_date = rec.begin_date, rec.expire_date
+            main_inscl_name, sub_inscl_name = rec.main_inscl_name, rec.sub_inscl_name
             # Upsert srm_check
-            upsert_srm_check(conn, cid, check_date, None, funds, resp.status_code)
+            upsert_srm_check(conn, cid, rec.check_date, rec.death_date, rec.funds, resp.status_code)
 
             with conn.cursor() as cur:
                 if system == 'hosxp':
@@ -825,7 +737,7 @@ class PatientToday(QWidget, PatientToday_ui):
                     sql_ovst = (
                         "UPDATE ovst o JOIN patient p ON p.hn = o.hn "
                         "SET o.pttype=%s, o.pttypeno=%s, o.hospmain=%s, o.hospsub=%s "
-                        "WHERE DATE(o.vstdate)=%s AND p.cid=%s"
+                        f"WHERE {day_range_sql('o.vstdate', '%s')} AND p.cid=%s"
                     )
                     cur.execute(sql_ovst, [
                         (new_type or None),
@@ -833,6 +745,7 @@ class PatientToday(QWidget, PatientToday_ui):
                         (hospmain_hcode or None),
                         (hospsub_hcode or None),
                         date_str,
+                        date_str,
                         cid,
                     ])
                 else:
@@ -885,10 +798,7 @@ class PatientToday(QWidget, PatientToday_ui):
                 pass
             QMessageBox.information(self, "สำเร็จ", f"อัปเดตสิทธิเรียบร้อยสำหรับ CID {cid}")
         finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
+            pool.release(conn)
 
 
 if __name__ == "__main__":
@@ -37,6 +37,12 @@ class Patient_ui(object):
         self.refresh_button.setFont(QFont("Segoe UI", 11))
         self.top_bar.addWidget(self.refresh_button)
 
+        self.refresh_list_button = QPushButton("🔃 รีเฟรชรายชื่อ", Patient_ui)
+        self.refresh_list_button.setMinimumWidth(140)
+        self.refresh_list_button.setFont(QFont("Segoe UI", 11))
+        self.refresh_list_button.setToolTip("ดึงเฉพาะรายชื่อที่มีการแก้ไขหลังการโหลดครั้งล่าสุด")
+        self.top_bar.addWidget(self.refresh_list_button)
+
         self.check_rights_button = QPushButton("✅ ตรวจสอบสิทธิ", Patient_ui)
         self.check_rights_button.setMinimumWidth(160)
         self.check_rights_button.setFont(QFont("Segoe UI", 11))
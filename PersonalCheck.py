@@ -5,7 +5,9 @@ from PyQt6.QtCore import Qt, QEvent, QSettings
 from PyQt6.QtGui import QIntValidator, QGuiApplication, QKeySequence
 
 from PersonalCheck_ui import PersonalCheck_ui
-from srm import read_token, call_right_search, refresh_token, open_srm_program
+from DbPool import get_pool
+from RightsParser import parse_rights
+from srm import read_token, cached_right_search, cache_ttl_from_settings, refresh_token, open_srm_program, configure_http_from_settings, day_range_sql
 from QtSmartCard import SmartCardObserver
 
 class PersonalCheck(QWidget, PersonalCheck_ui):
@@ -22,6 +24,7 @@ class PersonalCheck(QWidget, PersonalCheck_ui):
         
         # Initialize settings
         self.settings = QSettings("SRM_API", "MySQL_Settings")
+        configure_http_from_settings(self.settings)
         
         # Connect update button
         try:
@@ -212,7 +215,7 @@ class PersonalCheck(QWidget, PersonalCheck_ui):
                 QMessageBox.warning(self, "โทเคนไม่พร้อม", str(e))
                 return
 
-            resp = call_right_search(token, cid)
+            resp = cached_right_search(token, cid, cache_ttl_from_settings(self.settings, "single"))
             self._log(f"[API] GET right-search status={resp.status_code} {getattr(resp, 'reason', '')}")
             # If unauthorized, try refresh token once
             if resp.status_code == 401:
@@ -483,77 +486,16 @@ class PersonalCheck(QWidget, PersonalCheck_ui):
                 return
                 
             # Extract eligibility data
-            funds = self.current_data.get('funds', [])
-            f0 = funds[0] if funds else {}
-            
-            new_type = ""
-            new_no = ""
-            hospmain_hcode = None
-            hospsub_hcode = None
-            begin_date = None
-            expire_date = None
-            main_inscl_name = None
-            sub_inscl_name = None
-            
-            # Extract data from API response
-            try:
-                # Prefer top-level fields
-                subinscl_top = self.current_data.get('subinscl') or self.current_data.get('subInscl')
-                cardid_top = self.current_data.get('cardId') or self.current_data.get('cardID')
-                if subinscl_top:
-                    if isinstance(subinscl_top, dict):
-                        new_type = str(subinscl_top.get('id') or subinscl_top.get('name') or "")
-                        sub_inscl_name = str(subinscl_top.get('name') or "")
-                    else:
-                        new_type = str(subinscl_top)
-                if cardid_top:
-                    new_no = str(cardid_top)
-                    
-                maininscl_top = self.current_data.get('mainInscl') or self.current_data.get('maininscl')
-                if isinstance(maininscl_top, dict):
-                    main_inscl_name = str(maininscl_top.get('name') or "")
-                    
-                # Optional top-level hosp codes and dates
-                hm_top = self.current_data.get('hospMain') or {}
-                if isinstance(hm_top, dict):
-                    hospmain_hcode = hm_top.get('hcode')
-                hs_top = self.current_data.get('hospSub') or {}
-                if isinstance(hs_top, dict):
-                    hospsub_hcode = hs_top.get('hcode')
-                begin_date = self.current_data.get('startDateTime')
-                expire_date = self.current_data.get('expireDateTime')
-                
-                # Fallback to first fund entry
-                if ((not new_type) or (not new_no)) and isinstance(funds, list) and funds:
-                    f0 = funds[0] if isinstance(funds[0], dict) else {}
-                    if not new_type:
-                        sub = f0.get('subInscl') if isinstance(f0.get('subInscl'), dict) else None
-                        if sub:
-                            new_type = str(sub.get('id') or sub.get('name') or "")
-                            sub_inscl_name = str(sub.get('name') or "")
-                    if not new_no:
-                        new_no = str(f0.get('cardId') or f0.get('cardID') or "")
-                    
-                    hm = f0.get('hospMain') if isinstance(f0.get('hospMain'), dict) else None
-                    if hm and not hospmain_hcode:
-                        hospmain_hcode = hm.get('hcode')
-                    hs = f0.get('hospSub') if isinstance(f0.get('hospSub'), dict) else None
-                    if hs and not hospsub_hcode:
-                        hospsub_hcode = hs.get('hcode')
-                    if not begin_date:
-                        begin_date = f0.get('startDateTime')
-                    if not expire_date:
-                        expire_date = f0.get('expireDateTime')
-                        
-            except Exception as e:
-                traceback.print_exc()
+            rec = parse_rights(self.current_data)
+            new_type, new_no = rec.pttype, rec.pttype_no
+            hospmain_hcode, hospsub_hcode = rec.hospmain, rec.hospsub
+            begin_date, expire_date = rec.begin_date, rec.expire_date
+            main_inscl_name, sub_inscl_name = rec.main_inscl_name, rec.sub_inscl_name
                 
             # Update database
-            import pymysql
-            cfg = self._get_db_config()
             system = str(self.settings.value("system", "jhcis")).strip().lower()
             
-            with pymysql.connect(**cfg) as conn:
+            with get_pool(self._get_db_config(), self.settings).connection() as conn:
                 with conn.cursor() as cur:
                     if system == 'hosxp':
                         # Update person table
@@ -609,7 +551,7 @@ class PersonalCheck(QWidget, PersonalCheck_ui):
                             "UPDATE ovst o "
                             "JOIN patient p ON p.hn = o.hn "
                             "SET o.pttype=%s, o.pttypeno=%s, o.hospmain=%s, o.hospsub=%s "
-                            "WHERE DATE(o.vstdate)=CURDATE() AND p.cid=%s"
+                            f"WHERE {day_range_sql('o.vstdate')} AND p.cid=%s"
                         )
                         params_ovst = [
                             new_type or None,
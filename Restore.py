@@ -12,6 +12,63 @@ from PyQt6.QtGui import QCloseEvent
 from Restore_ui import Restore_ui
 
 
+NAVICAT_TOLERANT_ERRORS = (
+    'data too long for column',
+    'incorrect integer value',
+    'duplicate entry',
+    'truncated',
+)
+
+
+def _is_navicat_tolerant(e) -> bool:
+    error_str = str(e).lower()
+    return any(err in error_str for err in NAVICAT_TOLERANT_ERRORS)
+
+
+def _split_extended_insert(stmt: bytes):
+    """Split "INSERT INTO `t` VALUES (...),(...);" into one INSERT per row, or None if it is not one.
+
+    Quoted strings are skipped with MySQL backslash escapes, so '),(' inside a value does not split.
+    """
+    s = stmt.strip()
+    if s.endswith(b';'):
+        s = s[:-1]
+    if not s[:12].upper().startswith(b'INSERT INTO '):
+        return None
+    idx = s.upper().find(b' VALUES ')
+    if idx < 0:
+        return None
+    prefix = s[:idx + 8]
+    body = s[idx + 8:]
+    rows = []
+    depth = 0
+    start = 0
+    in_str = False
+    esc = False
+    for i, ch in enumerate(body):
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == 0x5C:  # backslash
+                esc = True
+            elif ch == 0x27:  # quote
+                in_str = False
+            continue
+        if ch == 0x27:
+            in_str = True
+        elif ch == 0x28:  # (
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == 0x29:  # )
+            depth -= 1
+            if depth == 0:
+                rows.append(body[start:i + 1])
+    if in_str or depth != 0 or len(rows) < 2:
+        return None
+    return [prefix + r + b';' for r in rows]
+
+
 class Restore(QWidget, Restore_ui):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -190,6 +247,24 @@ class RestoreWorker(QObject):
                 pass
             self._conn = None
 
+    def _exec_rows(self, conn, statements: list) -> tuple:
+        """Execute single-row INSERTs one by one; returns (succeeded, [errors])."""
+        import pymysql
+        ok = 0
+        errors = []
+        for stmt in statements:
+            if self._stop:
+                break
+            try:
+                with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+                    cursor.execute(stmt)
+                conn.commit()
+                ok += 1
+            except Exception as e:
+                print("exec row error:", e)
+                errors.append(e)
+        return ok, errors
+
     def _exec_sql_file(self, conn, file_path: str):
         import pymysql
         from pymysql.constants import CLIENT
@@ -235,32 +310,31 @@ class RestoreWorker(QObject):
                     except Exception as e:
                         if not self._stop:  # Only log errors if not intentionally stopped
                             print("exec error:", e)
-                            
-                            # Check if this is a Navicat-tolerant error
-                            error_str = str(e).lower()
-                            navicat_tolerant = any(err in error_str for err in [
-                                'data too long for column',
-                                'incorrect integer value',
-                                'duplicate entry',
-                                'truncated'
-                            ])
-                            
-                            if navicat_tolerant:
-                                navicat_tolerant_count += 1
-                                # Log Navicat-tolerant errors as warnings (only first few)
-                                if navicat_tolerant_count <= 5:
-                                    self.log_line.emit(f"WARNING: {os.path.basename(file_path)} -> {e} (Navicat-tolerant)")
-                            else:
-                                error_count += 1
-                                # Only log first 10 non-tolerant errors to avoid spam
-                                if error_count <= 10:
-                                    self.log_line.emit(f"ERROR: {os.path.basename(file_path)} -> {e}")
-                                    # Show the problematic SQL for debugging
-                                    if error_count <= 3:
-                                        sql_preview = buf.decode('utf-8', 'ignore')[:200]
-                                        self.log_line.emit(f"SQL Preview: {sql_preview}...")
-                                elif error_count == 11:
-                                    self.log_line.emit(f"ERROR: Too many errors in {os.path.basename(file_path)}, suppressing further messages")
+                            errors = [e]
+                            if _is_navicat_tolerant(e):
+                                rows = _split_extended_insert(buf)
+                                if rows is not None:
+                                    # A multi-row INSERT failed: redo it row by row so only the offending rows are lost
+                                    ok, errors = self._exec_rows(conn, rows)
+                                    success_count += ok
+                            for err in errors:
+                                # Check if this is a Navicat-tolerant error
+                                if _is_navicat_tolerant(err):
+                                    navicat_tolerant_count += 1
+                                    # Log Navicat-tolerant errors as warnings (only first few)
+                                    if navicat_tolerant_count <= 5:
+                                        self.log_line.emit(f"WARNING: {os.path.basename(file_path)} -> {err} (Navicat-tolerant)")
+                                else:
+                                    error_count += 1
+                                    # Only log first 10 non-tolerant errors to avoid spam
+                                    if error_count <= 10:
+                                        self.log_line.emit(f"ERROR: {os.path.basename(file_path)} -> {err}")
+                                        # Show the problematic SQL for debugging
+                                        if error_count <= 3:
+                                            sql_preview = buf.decode('utf-8', 'ignore')[:200]
+                                            self.log_line.emit(f"SQL Preview: {sql_preview}...")
+                                    elif error_count == 11:
+                                        self.log_line.emit(f"ERROR: Too many errors in {os.path.basename(file_path)}, suppressing further messages")
                         else:
                             self.ask_ui_reset.emit()
                             return False
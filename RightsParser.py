@@ -0,0 +1,156 @@
+from typing import Optional
+
+
+# Key variants seen in SRM right-search responses, in lookup order
+_SUB_KEYS = ("subInscl", "subinscl")
+_MAIN_KEYS = ("mainInscl", "maininscl")
+_CARD_KEYS = ("cardId", "cardID")
+_DEATH_KEYS = ("deathDate", "deathdate", "death_date")
+
+
+class RightsRecord:
+    """Rights extracted from one SRM right-search body.
+
+    pttype / pttype_no are strings ("" when absent); the other fields are None
+    when absent. funds is the raw funds list for srm_check. error is set when
+    the response body could not be read at all.
+    """
+
+    __slots__ = (
+        "check_date",
+        "funds",
+        "pttype",
+        "pttype_no",
+        "hospmain",
+        "hospsub",
+        "begin_date",
+        "expire_date",
+        "main_inscl_name",
+        "sub_inscl_name",
+        "death_date",
+        "error",
+    )
+
+    def __init__(self):
+        self.check_date = None
+        self.funds = []
+        self.pttype = ""
+        self.pttype_no = ""
+        self.hospmain = None
+        self.hospsub = None
+        self.begin_date = None
+        self.expire_date = None
+        self.main_inscl_name = None
+        self.sub_inscl_name = None
+        self.death_date = None
+        self.error = None
+
+    @property
+    def has_rights(self) -> bool:
+        return bool(self.pttype or self.pttype_no)
+
+    def update_kwargs(self) -> dict:
+        """Keyword arguments for RightsUpdateWriter.add()."""
+        return {
+            "pttype": self.pttype,
+            "pttype_no": self.pttype_no,
+            "hospmain": self.hospmain,
+            "hospsub": self.hospsub,
+            "begin_date": self.begin_date,
+            "expire_date": self.expire_date,
+            "main_inscl_name": self.main_inscl_name,
+            "sub_inscl_name": self.sub_inscl_name,
+        }
+
+    def __repr__(self) -> str:
+        return "RightsRecord(" + ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__ if k != "funds") + ")"
+
+
+def _first(d: dict, keys):
+    for k in keys:
+        v = d.get(k)
+        if v:
+            return v
+    return None
+
+
+def _death(d: dict) -> Optional[str]:
+    for k in _DEATH_KEYS:
+        v = d.get(k)
+        if v:
+            return v if isinstance(v, str) and v.strip() else None
+    return None
+
+
+def parse_rights(data) -> RightsRecord:
+    """Extract new rights from a right-search body in one pass.
+
+    Top-level fields win; anything missing falls back to the first fund entry.
+    The death date is taken from the top level or the first fund that has one.
+    Never raises: a malformed body yields an empty record.
+    """
+    rec = RightsRecord()
+    if not isinstance(data, dict):
+        return rec
+    rec.check_date = data.get("checkDate")
+    funds = data.get("funds")
+    if not isinstance(funds, list):
+        funds = []
+    rec.funds = funds
+    f0 = funds[0] if funds and isinstance(funds[0], dict) else None
+
+    sub = _first(data, _SUB_KEYS)
+    if sub is None and f0 is not None:
+        sub = f0.get("subInscl")
+    if isinstance(sub, dict):
+        rec.pttype = str(sub.get("id") or sub.get("name") or "")
+        rec.sub_inscl_name = str(sub.get("name") or "") or None
+    elif sub:
+        rec.pttype = str(sub)
+
+    card = _first(data, _CARD_KEYS)
+    if card is None and f0 is not None:
+        card = _first(f0, _CARD_KEYS)
+    rec.pttype_no = str(card or "")
+
+    main = _first(data, _MAIN_KEYS)
+    if not isinstance(main, dict) and f0 is not None:
+        main = f0.get("mainInscl")
+    if isinstance(main, dict):
+        rec.main_inscl_name = str(main.get("name") or "") or None
+
+    hm = data.get("hospMain")
+    if not isinstance(hm, dict) and f0 is not None:
+        hm = f0.get("hospMain")
+    if isinstance(hm, dict):
+        rec.hospmain = hm.get("hcode")
+    hs = data.get("hospSub")
+    if not isinstance(hs, dict) and f0 is not None:
+        hs = f0.get("hospSub")
+    if isinstance(hs, dict):
+        rec.hospsub = hs.get("hcode")
+
+    rec.begin_date = data.get("startDateTime") or (f0.get("startDateTime") if f0 is not None else None)
+    rec.expire_date = data.get("expireDateTime") or (f0.get("expireDateTime") if f0 is not None else None)
+
+    death = _death(data)
+    if death is None:
+        for f in funds:
+            if isinstance(f, dict):
+                death = _death(f)
+                if death is not None:
+                    break
+    rec.death_date = death
+    return rec
+
+
+def parse_response(resp) -> RightsRecord:
+    """parse_rights() on a response's JSON body; a non-JSON body yields an empty record with error set."""
+    try:
+        data = resp.json()
+    except Exception as e:
+        print(f"[PARSE] right-search body is not JSON: {e}")
+        rec = RightsRecord()
+        rec.error = str(e) or type(e).__name__
+        return rec
+    return parse_rights(data)
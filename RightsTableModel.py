@@ -0,0 +1,224 @@
+from typing import Iterable, List, Optional
+
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+class RightsTableModel(QAbstractTableModel):
+    """Column-oriented table model for patient rights lists (Patient, PatientToday).
+
+    Layout is ``["check"] + headers + ["pttype_new", "pttype_no_new"]``. Each data
+    column is a plain list of strings, the check state is one byte per row and the
+    new-rights columns are two string lists; cells are built on demand in data().
+    """
+
+    NEW_HEADERS = ("pttype_new", "pttype_no_new")
+
+    def __init__(self, headers: List[str], rows: Optional[Iterable[tuple]] = None, parent=None):
+        super().__init__(parent)
+        self._headers = ["check"] + list(headers) + list(self.NEW_HEADERS)
+        self._ncols = len(headers)
+        self._columns: List[List[str]] = [[] for _ in range(self._ncols)]
+        self._checked = bytearray()
+        self._pttype_new: List[str] = []
+        self._pttype_no_new: List[str] = []
+        try:
+            self._cid_idx = list(headers).index("cid")
+        except ValueError:
+            self._cid_idx = -1
+        self._cid_rows = {}
+        if rows:
+            self._append(rows)
+
+    # --- Qt model interface ---
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._checked)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._headers)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            if 0 <= section < len(self._headers):
+                return self._headers[section]
+            return None
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if col == 0:
+            if role == Qt.ItemDataRole.CheckStateRole:
+                return Qt.CheckState.Checked if self._checked[row] else Qt.CheckState.Unchecked
+            return None
+        if role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+        if col <= self._ncols:
+            return self._columns[col - 1][row]
+        if col == self._ncols + 1:
+            return self._pttype_new[row]
+        return self._pttype_no_new[row]
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole) -> bool:
+        if not index.isValid() or index.column() != 0 or role != Qt.ItemDataRole.CheckStateRole:
+            return False
+        state = getattr(value, "value", value)
+        self.set_checked(index.row(), state == Qt.CheckState.Checked.value)
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    # --- Helpers ---
+    def headers(self) -> List[str]:
+        return list(self._headers)
+
+    def append_rows(self, rows: Iterable[tuple]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        first = len(self._checked)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._append(rows)
+        self.endInsertRows()
+        return len(rows)
+
+    def set_rows(self, rows: Iterable[tuple]) -> None:
+        self.beginResetModel()
+        self._columns = [[] for _ in range(self._ncols)]
+        self._checked = bytearray()
+        self._pttype_new = []
+        self._pttype_no_new = []
+        self._cid_rows = {}
+        self._append(rows)
+        self.endResetModel()
+
+    def upsert_rows(self, rows: Iterable[tuple]) -> tuple:
+        """Merge rows by cid: existing rows get new data columns (check and new-rights
+        state are kept), unknown cids are appended. Returns (updated, inserted)."""
+        fresh = []
+        updated = 0
+        last_col = self._ncols
+        for r in rows:
+            cid = str(r[self._cid_idx]) if self._cid_idx >= 0 and r[self._cid_idx] is not None else ""
+            targets = self._cid_rows.get(cid) if cid else None
+            if not targets:
+                fresh.append(r)
+                continue
+            texts = [self._text(r[i] if i < len(r) else None) for i in range(self._ncols)]
+            for row in targets:
+                for i, text in enumerate(texts):
+                    self._columns[i][row] = text
+                self.dataChanged.emit(self.index(row, 1), self.index(row, last_col), [Qt.ItemDataRole.DisplayRole])
+                updated += 1
+        inserted = self.append_rows(fresh)
+        return updated, inserted
+
+    def remove_cids(self, cids: Iterable[str]) -> int:
+        """Drop every row whose cid is in cids; returns the number of rows removed."""
+        doomed = sorted({row for cid in cids for row in self._cid_rows.get(str(cid), ())}, reverse=True)
+        for row in doomed:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            for col in self._columns:
+                del col[row]
+            del self._checked[row]
+            del self._pttype_new[row]
+            del self._pttype_no_new[row]
+            self.endRemoveRows()
+        if doomed:
+            self._reindex()
+        return len(doomed)
+
+    def snapshot_rows(self) -> List[tuple]:
+        """Data columns as row tuples (no check or new-rights state), e.g. for RosterCache."""
+        return list(zip(*self._columns)) if self._columns else []
+
+    def cid_at(self, row: int) -> str:
+        if self._cid_idx < 0 or not (0 <= row < len(self._checked)):
+            return ""
+        return self._columns[self._cid_idx][row]
+
+    def rows_for_cid(self, cid: str) -> List[int]:
+        return list(self._cid_rows.get(str(cid), ()))
+
+    def cids(self) -> List[str]:
+        return list(self._cid_rows.keys())
+
+    def is_checked(self, row: int) -> bool:
+        return 0 <= row < len(self._checked) and bool(self._checked[row])
+
+    def set_checked(self, row: int, checked: bool = True) -> None:
+        if not (0 <= row < len(self._checked)):
+            return
+        value = 1 if checked else 0
+        if self._checked[row] == value:
+            return
+        self._checked[row] = value
+        idx = self.index(row, 0)
+        self.dataChanged.emit(idx, idx, [Qt.ItemDataRole.CheckStateRole])
+
+    def set_checked_cids(self, cids: Iterable[str]) -> int:
+        """Tick every row whose cid is in cids; returns the number of rows changed."""
+        changed = []
+        for cid in cids:
+            for row in self._cid_rows.get(str(cid), ()):
+                if not self._checked[row]:
+                    self._checked[row] = 1
+                    changed.append(row)
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), 0), self.index(max(changed), 0), [Qt.ItemDataRole.CheckStateRole])
+        return len(changed)
+
+    def set_new_rights(self, row: int, pttype_new: str, pttype_no_new: str) -> None:
+        if not (0 <= row < len(self._checked)):
+            return
+        self._pttype_new[row] = str(pttype_new or "")
+        self._pttype_no_new[row] = str(pttype_no_new or "")
+        first = self._ncols + 1
+        self.dataChanged.emit(self.index(row, first), self.index(row, first + 1), [Qt.ItemDataRole.DisplayRole])
+
+    @staticmethod
+    def _text(val) -> str:
+        if val is None:
+            return ""
+        if isinstance(val, str):
+            return val
+        if isinstance(val, (bytes, bytearray)):
+            return bytes(val).decode("utf-8", "ignore")
+        try:
+            return str(val)
+        except Exception:
+            return repr(val)
+
+    def _reindex(self) -> None:
+        self._cid_rows = {}
+        if self._cid_idx < 0:
+            return
+        for row, cid in enumerate(self._columns[self._cid_idx]):
+            if cid:
+                self._cid_rows.setdefault(cid, []).append(row)
+
+    def _append(self, rows: Iterable[tuple]) -> None:
+        columns = self._columns
+        ncols = self._ncols
+        text = self._text
+        for r in rows:
+            row = len(self._checked)
+            for i in range(ncols):
+                columns[i].append(text(r[i] if i < len(r) else None))
+            self._checked.append(0)
+            self._pttype_new.append("")
+            self._pttype_no_new.append("")
+            if self._cid_idx >= 0:
+                cid = columns[self._cid_idx][row]
+                if cid:
+                    self._cid_rows.setdefault(cid, []).append(row)
@@ -0,0 +1,138 @@
+import json
+import os
+import sqlite3
+import threading
+import traceback
+from datetime import datetime
+from typing import List, Optional
+
+
+def default_cache_path() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    return os.path.join(base, "SRM_API", "roster_cache.sqlite")
+
+
+def roster_target(cfg: dict, system: str) -> str:
+    """Cache key for one HIS database: system://host:port/database."""
+    return f"{system}://{cfg.get('host', '')}:{cfg.get('port', '')}/{cfg.get('database', '')}"
+
+
+class RosterCache:
+    """SQLite snapshot of the last loaded patient roster, one snapshot per DB target.
+
+    Rows are stored as JSON arrays of display strings together with the headers
+    and the high-water mark used for the next delta refresh.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_cache_path()
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS roster_meta (
+                target TEXT PRIMARY KEY,
+                headers TEXT NOT NULL,
+                high_water TEXT NULL,
+                row_count INTEGER NOT NULL,
+                saved_at TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS roster_rows (
+                target TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (target, seq)
+            )
+            """
+        )
+        return conn
+
+    def load(self, target: str):
+        """Return (headers, rows, high_water) for target, or None when nothing is cached."""
+        with self._lock:
+            try:
+                conn = self._connect()
+            except Exception as e:
+                traceback.print_exc()
+                return None
+            try:
+                meta = conn.execute(
+                    "SELECT headers, high_water FROM roster_meta WHERE target = ?", (target,)
+                ).fetchone()
+                if not meta:
+                    return None
+                headers = json.loads(meta[0])
+                high_water = datetime.fromisoformat(meta[1]) if meta[1] else None
+                loads = json.loads
+                rows = [
+                    tuple(loads(r[0]))
+                    for r in conn.execute("SELECT data FROM roster_rows WHERE target = ? ORDER BY seq", (target,))
+                ]
+                return headers, rows, high_water
+            except Exception as e:
+                traceback.print_exc()
+                return None
+            finally:
+                conn.close()
+
+    def save(self, target: str, headers: List[str], rows, high_water=None) -> bool:
+        """Replace the snapshot for target in one transaction."""
+        with self._lock:
+            try:
+                conn = self._connect()
+            except Exception as e:
+                traceback.print_exc()
+                return False
+            try:
+                dumps = json.dumps
+                with conn:
+                    conn.execute("DELETE FROM roster_rows WHERE target = ?", (target,))
+                    conn.executemany(
+                        "INSERT INTO roster_rows (target, seq, data) VALUES (?, ?, ?)",
+                        ((target, i, dumps(list(r), ensure_ascii=False)) for i, r in enumerate(rows)),
+                    )
+                    count = conn.execute("SELECT COUNT(*) FROM roster_rows WHERE target = ?", (target,)).fetchone()[0]
+                    conn.execute(
+                        "REPLACE INTO roster_meta (target, headers, high_water, row_count, saved_at) VALUES (?, ?, ?, ?, ?)",
+                        (
+                            target,
+                            dumps(list(headers), ensure_ascii=False),
+                            high_water.isoformat() if isinstance(high_water, datetime) else None,
+                            count,
+                            datetime.now().isoformat(timespec="seconds"),
+                        ),
+                    )
+                return True
+            except Exception as e:
+                traceback.print_exc()
+                return False
+            finally:
+                conn.close()
+
+    def save_async(self, target: str, headers: List[str], rows, high_water=None) -> threading.Thread:
+        """Save on a daemon thread; rows must already be a snapshot the caller will not mutate."""
+        t = threading.Thread(target=self.save, args=(target, headers, rows, high_water), daemon=True)
+        t.start()
+        return t
+
+    def clear(self, target: Optional[str] = None) -> None:
+        with self._lock:
+            try:
+                conn = self._connect()
+                with conn:
+                    if target is None:
+                        conn.execute("DELETE FROM roster_rows")
+                        conn.execute("DELETE FROM roster_meta")
+                    else:
+                        conn.execute("DELETE FROM roster_rows WHERE target = ?", (target,))
+                        conn.execute("DELETE FROM roster_meta WHERE target = ?", (target,))
+                conn.close()
+            except Exception as e:
+                traceback.print_exc()
@@ -6,6 +6,8 @@ from PyQt6.QtWidgets import QWidget, QApplication, QMessageBox, QMdiSubWindow
 from PyQt6.QtCore import QSettings, QLocale
 
 from Setting_ui import Setting_ui
+from DbPool import close_pools
+from srm import invalidate_schema_cache
 
 
 class Setting(QWidget, Setting_ui):
@@ -96,6 +98,10 @@ class Setting(QWidget, Setting_ui):
             self.settings.setValue("timeout", cfg["connect_timeout"])
             self.settings.setValue("system", cfg["system"])
             self.settings.sync()
+            # Connection target may have changed; re-probe HIS schema on next use
+            invalidate_schema_cache()
+            # Drop idle pooled connections to the old target
+            close_pools()
             QMessageBox.information(self, "บันทึกแล้ว", "บันทึกการตั้งค่าเรียบร้อย")
             # Close settings form after successful save
             self.on_cancel()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import threading
+import traceback
+from datetime import datetime
+from typing import Iterable, Optional
+
+
+def default_checkpoint_dir() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    return os.path.join(base, "SRM_API", "checkpoints")
+
+
+def sweep_hash(cids: Iterable[str], scope: str = "") -> str:
+    """Stable id of a sweep: scope (e.g. DB target) plus the ordered CID list."""
+    h = hashlib.sha256(str(scope).encode("utf-8"))
+    for cid in cids:
+        h.update(b"\n")
+        h.update(str(cid).encode("ascii", "ignore"))
+    return h.hexdigest()
+
+
+class SweepCheckpoint:
+    """Append-only journal of the CIDs a rights sweep has finished.
+
+    The journal is ``<dir>/<sweep hash>.jsonl``: a header line followed by one
+    completed CID per line. Reopening the same CID list (same hash) restores
+    ``done`` so a restarted sweep skips finished work. mark() only buffers;
+    commit() appends and fsyncs, so call it once the matching srm_check rows are
+    written. complete() removes the journal when the sweep ends normally.
+    """
+
+    def __init__(self, path: str, sweep_id: str, total: int, done: set):
+        self.path = path
+        self.sweep_id = sweep_id
+        self.total = total
+        self.done = done
+        self._pending = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, cids: Iterable[str], scope: str = "", directory: Optional[str] = None) -> "SweepCheckpoint":
+        cids = [str(c) for c in cids]
+        sweep_id = sweep_hash(cids, scope)
+        directory = directory or default_checkpoint_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{sweep_id}.jsonl")
+        done = set()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    next(f, None)  # header
+                    for line in f:
+                        cid = line.strip()
+                        if cid:
+                            done.add(cid)
+            except Exception as e:
+                traceback.print_exc()
+        else:
+            header = {"sweep": sweep_id, "scope": scope, "total": len(cids), "created": datetime.now().isoformat(timespec="seconds")}
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        return cls(path, sweep_id, len(cids), done)
+
+    def __contains__(self, cid) -> bool:
+        return str(cid) in self.done
+
+    def mark(self, cid: str) -> None:
+        cid = str(cid)
+        with self._lock:
+            if cid not in self.done:
+                self.done.add(cid)
+                self._pending.append(cid)
+
+    def commit(self) -> int:
+        """Persist marks made since the last commit; returns how many were written."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(pending) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                self._pending[:0] = pending
+            return 0
+        return len(pending)
+
+    def complete(self) -> None:
+        """The sweep finished: drop the journal so the next sweep starts fresh."""
+        with self._lock:
+            self._pending = []
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        except Exception as e:
+            traceback.print_exc()
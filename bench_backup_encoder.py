@@ -0,0 +1,117 @@
+"""Throughput benchmark for BackupEncoder against the former per-cell Backup path.
+
+Rows are synthetic HOSxP-like tuples of raw bytes, as Backup reads them with
+CAST(col AS BINARY):
+
+    python bench_backup_encoder.py               # 1,000,000 rows
+    python bench_backup_encoder.py -n 200000 --mixed
+"""
+import argparse
+import random
+import sys
+import time
+
+from BackupEncoder import build_row_encoder
+
+
+TEXT_TYPES = ["int(11)", "varchar(13)", "varchar(100)", "varchar(250)", "datetime", "decimal(12,2)", "char(1)", "text"]
+MIXED_TYPES = TEXT_TYPES + ["longblob"]
+
+
+def make_rows(n: int, mixed: bool, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    thai = ["สมชาย", "ใจดี", "บ้านแวงใหญ่", "ขอนแก่น", "สิทธิหลักประกันสุขภาพแห่งชาติ"]
+    rows = []
+    for i in range(n):
+        row = [
+            str(i).encode("ascii"),
+            str(3650100000000 + i).encode("ascii"),
+            rnd.choice(thai).encode("tis-620"),
+            (f"O'Brien {i}" if i % 50 == 0 else f"note {i}").encode("ascii"),
+            b"2025-11-01 22:15:14",
+            f"{rnd.random() * 1000:.2f}".encode("ascii"),
+            b"Y" if i % 3 else None,
+            ("ผู้ป่วย\nนัดครั้งถัดไป" if i % 10 == 0 else "ok").encode("tis-620"),
+        ]
+        if mixed:
+            row.append(bytes(rnd.getrandbits(8) for _ in range(16)) if i % 4 == 0 else None)
+        rows.append(tuple(row))
+    return rows
+
+
+def build_legacy_encoder(col_types):
+    """The per-cell logic Backup used before BackupEncoder (kept here as the baseline).
+
+    Like the old code, column flags are parsed once per table into parallel lists.
+    """
+    import re
+    col_is_blob = []
+    col_max_lengths = []
+    for tstr in col_types:
+        tl = tstr.lower()
+        is_str = any(k in tl for k in ['char', 'text', 'enum', 'set'])
+        col_is_blob.append(any(k in tl for k in ['blob', 'binary']))
+        max_len = None
+        if is_str:
+            match = re.search(r'(\d+)', tstr)
+            if match and int(match.group(1)) > 10000:
+                max_len = int(match.group(1))
+        col_max_lengths.append(max_len)
+
+    def escape(s, max_length=None):
+        if max_length and len(s) > max_length:
+            s = s[:max_length]
+        s = s.replace("\\", "\\\\").replace("'", "\\'")
+        return f"'{s}'"
+
+    def encode_row(row) -> str:
+        out_vals = []
+        for idx, v in enumerate(row):
+            is_bin = col_is_blob[idx] if idx < len(col_is_blob) else False
+            max_len = col_max_lengths[idx] if idx < len(col_max_lengths) else None
+            if is_bin:
+                b = bytes(v) if isinstance(v, (bytes, bytearray)) else str(v).encode('utf-8', 'ignore')
+                out_vals.append('0x' + b.hex())
+                continue
+            s = None
+            if isinstance(v, (bytes, bytearray)):
+                for enc in ('tis-620', 'utf-8', 'latin-1', 'cp874'):
+                    try:
+                        s = bytes(v).decode(enc)
+                        break
+                    except Exception:
+                        s = None
+            else:
+                s = str(v)
+            if s == 'None':
+                s = ''
+            out_vals.append(escape(s, max_len))
+        return "(" + ", ".join(out_vals) + ")"
+    return encode_row
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark backup row encoding")
+    p.add_argument("-n", "--rows", type=int, default=1000000)
+    p.add_argument("--mixed", action="store_true", help="add a blob column (per-column encoder path)")
+    args = p.parse_args(argv)
+
+    col_types = MIXED_TYPES if args.mixed else TEXT_TYPES
+    rows = make_rows(args.rows, args.mixed)
+    print(f"rows={len(rows)} columns={len(col_types)} mixed={args.mixed}")
+
+    results = {}
+    for name, encode in (("legacy", build_legacy_encoder(col_types)), ("encoder", build_row_encoder(col_types))):
+        start = time.perf_counter()
+        total = 0
+        for r in rows:
+            total += len(encode(r))
+        elapsed = time.perf_counter() - start
+        results[name] = elapsed
+        print(f"{name:8s} {elapsed:7.2f}s {len(rows) / elapsed:12,.0f} rows/s  chars={total:,}")
+    print(f"speedup  {results['legacy'] / results['encoder']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Micro-benchmark for RightsParser.parse_rights over recorded SRM responses.
+
+    python bench_rights_parser.py                 # api_resp.json
+    python bench_rights_parser.py a.json b.json -n 200000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+from RightsParser import parse_rights
+
+
+def load_bodies(paths):
+    bodies = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # A file may hold one response or a list of recorded responses
+        bodies.extend(data if isinstance(data, list) else [data])
+    return bodies
+
+
+def main(argv=None) -> int:
+    here = os.path.dirname(os.path.abspath(__file__))
+    p = argparse.ArgumentParser(description="Benchmark rights parsing per SRM response")
+    p.add_argument("files", nargs="*", default=[os.path.join(here, "api_resp.json")])
+    p.add_argument("-n", "--number", type=int, default=100000, help="parses per repeat")
+    p.add_argument("-r", "--repeat", type=int, default=5)
+    args = p.parse_args(argv)
+
+    bodies = load_bodies(args.files)
+    if not bodies:
+        print("no responses to parse", file=sys.stderr)
+        return 1
+    print(parse_rights(bodies[0]))
+
+    count = len(bodies)
+
+    def run():
+        for i in range(args.number):
+            parse_rights(bodies[i % count])
+
+    best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+    print(f"responses={count} parses={args.number} best={best:.3f}s per_response={best / args.number * 1e6:.2f}us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
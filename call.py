@@ -1,6 +1,7 @@
 import requests
 import json
 import os
+from srm import read_token
 
 pid = "3650100813118"
 pid = "3650101207220"
@@ -8,15 +9,7 @@ pid = "3650100810895"
 url = f"https://srm.nhso.go.th/api/ucws/v1/right-search?pid={pid}"
 
 # อ่าน token จากไฟล์
-token_file = os.path.join(os.environ['USERPROFILE'], 'SRM Smart Card Single Sign-On', 'token.txt')
-with open(token_file, 'r', encoding='utf-8') as f:
-    for line in f:
-        line = line.strip()
-        if line.startswith('access-token='):
-            token = line.split('=', 1)[1]
-            break
-    else:
-        raise ValueError("ไม่พบ access-token ในไฟล์")
+token = read_token()
 
 #print(token)
 
@@ -2,17 +2,13 @@ import os
 import requests
 import json
 
+from srm import token_file
+
 
 # อ่าน refresh_token จากไฟล์
-token_file = os.path.join(os.environ['USERPROFILE'], 'SRM Smart Card Single Sign-On', 'token.txt')
-with open(token_file, 'r', encoding='utf-8') as f:
-    for line in f:
-        line = line.strip()
-        if line.startswith('refresh-token='):
-            refresh_token = line.split('=', 1)[1]
-            break
-    else:
-        raise ValueError("ไม่พบ refresh-token ในไฟล์")
+refresh_token = token_file.refresh_token(force=True)
+if not refresh_token:
+    raise ValueError("ไม่พบ refresh-token ในไฟล์")
 
 # ขอ access token ใหม่โดยใช้ refresh token
 url = "https://srmportal.nhso.go.th/api/scard/access-token"
@@ -61,22 +57,7 @@ if new_access_token is None and parsed is None:
 
 # เขียนกลับเฉพาะค่า access-token โดยรักษาบรรทัดอื่น ๆ ไว้ (เช่น refresh-token)
 if new_access_token:
-    # อ่านบรรทัดทั้งหมดก่อน
-    with open(token_file, 'r', encoding='utf-8') as fr:
-        lines = fr.readlines()
-    found = False
-    new_lines = []
-    for line in lines:
-        raw = line.rstrip('\n')
-        if raw.startswith('access-token='):
-            new_lines.append(f"access-token={new_access_token}\n")
-            found = True
-        else:
-            new_lines.append(line)
-    if not found:
-        new_lines.append(f"access-token={new_access_token}\n")
-    with open(token_file, 'w', encoding='utf-8') as fw:
-        fw.writelines(new_lines)
+    token_file.write(access=new_access_token)
 else:
     # ไม่มีโทเค่นใหม่ให้เขียน (เช่นกรณี error) — ไม่เขียนทับไฟล์
     pass
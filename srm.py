@@ -1,21 +1,342 @@
 import os
 import json
+import base64
 import traceback
 import subprocess
-from datetime import datetime
-from typing import Optional
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import JSONDecodeError as RequestsJSONDecodeError
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+# HTTP session defaults (overridable via configure_http / QSettings)
+SRM_CONNECT_TIMEOUT = 5
+SRM_READ_TIMEOUT = 30
+SRM_POOL_SIZE = 8
+
+_http_lock = threading.Lock()
+_http_session = None
+_http_options = {
+    "connect_timeout": SRM_CONNECT_TIMEOUT,
+    "read_timeout": SRM_READ_TIMEOUT,
+    "pool_size": SRM_POOL_SIZE,
+}
+_http_stats = {"requests": 0, "connections": 0}
+
+
+def _count_http(key: str) -> None:
+    with _http_lock:
+        _http_stats[key] += 1
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count_http("connections")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count_http("connections")
+        return super()._new_conn()
+
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools count newly opened connections."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+def configure_http(connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None, pool_size: Optional[int] = None) -> None:
+    """Set timeouts and pool size for SRM requests; the session is rebuilt only when the pool size changes."""
+    global _http_session
+    with _http_lock:
+        if connect_timeout is not None:
+            _http_options["connect_timeout"] = max(1.0, float(connect_timeout))
+        if read_timeout is not None:
+            _http_options["read_timeout"] = max(1.0, float(read_timeout))
+        if pool_size is not None:
+            pool_size = max(1, int(pool_size))
+            if pool_size != _http_options["pool_size"]:
+                _http_options["pool_size"] = pool_size
+                old = _http_session
+                _http_session = None
+                if old is not None:
+                    try:
+                        old.close()
+                    except Exception as e:
+                        traceback.print_exc()
+
+
+def configure_http_from_settings(settings) -> None:
+    """Apply srm_* HTTP options stored in QSettings (or any object with value())."""
+    try:
+        # Keep at least one pooled connection per concurrent right-search request
+        pool_size = max(
+            int(settings.value("srm_pool_size", SRM_POOL_SIZE)),
+            int(settings.value("rights_concurrency", RIGHTS_MAX_IN_FLIGHT)),
+        )
+        configure_http(
+            connect_timeout=settings.value("srm_connect_timeout", SRM_CONNECT_TIMEOUT),
+            read_timeout=settings.value("srm_read_timeout", SRM_READ_TIMEOUT),
+            pool_size=pool_size,
+        )
+        rate_limiter.configure(float(settings.value("srm_max_rps", SRM_MAX_RPS)))
+    except Exception as e:
+        traceback.print_exc()
+
+
+def get_http_session() -> requests.Session:
+    """Return the shared keep-alive session used for all SRM calls."""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            session = requests.Session()
+            pool_size = _http_options["pool_size"]
+            adapter = _PooledAdapter(pool_connections=2, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Connection": "keep-alive"})
+            _http_session = session
+        return _http_session
+
+
+def _http_timeout() -> tuple:
+    return (_http_options["connect_timeout"], _http_options["read_timeout"])
+
+
+def http_stats() -> dict:
+    """Return request/connection counters; reused = requests served on an existing connection."""
+    with _http_lock:
+        requests_total = _http_stats["requests"]
+        connections = _http_stats["connections"]
+    return {
+        "requests": requests_total,
+        "connections": connections,
+        "reused": max(0, requests_total - connections),
+    }
+
+
+# Client-side request ceiling for the SRM API (requests per second)
+SRM_MAX_RPS = 10.0
+SRM_MIN_RPS = 0.5
+SRM_MAX_RETRY_AFTER = 120.0
+# Statuses that mean "slow down" rather than "this CID failed"
+SRM_THROTTLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """Token bucket shared by all SRM calls with adaptive (AIMD) backoff.
+
+    The refill rate halves on every throttle response and creeps back towards
+    max_rps on each success; Retry-After pauses the bucket entirely.
+    """
+
+    def __init__(self, max_rps: float = SRM_MAX_RPS, min_rps: float = SRM_MIN_RPS):
+        self._lock = threading.Lock()
+        self.min_rps = float(min_rps)
+        self.max_rps = max(self.min_rps, float(max_rps))
+        self.rate = self.max_rps
+        self._tokens = 1.0
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+
+    def configure(self, max_rps: float) -> None:
+        with self._lock:
+            self.max_rps = max(self.min_rps, float(max_rps))
+            self.rate = min(self.rate, self.max_rps)
+
+    def _capacity(self) -> float:
+        return max(1.0, self.rate)
+
+    def acquire(self) -> None:
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self._capacity(), self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return
+                    wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rps, self.rate + self.max_rps * 0.05)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.rate = max(self.min_rps, self.rate / 2.0)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + min(SRM_MAX_RETRY_AFTER, pause))
+            self._tokens = 0.0
+            self._last = self._paused_until
+
+
+rate_limiter = RateLimiter()
+
+
+def _parse_retry_after(value) -> Optional[float]:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        dt = parsedate_to_datetime(str(value))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return max(0.0, (dt - datetime.now(timezone.utc)).total_seconds())
+    except Exception as e:
+        traceback.print_exc()
+        return None
+
+
+# How often TokenFile re-stats token.txt to notice writes by the SSO program
+TOKEN_FILE_POLL = 1.0
+
+
+def default_token_path() -> str:
+    return os.path.join(os.environ.get('USERPROFILE') or os.path.expanduser('~'), 'SRM Smart Card Single Sign-On', 'token.txt')
+
+
+class TokenFile:
+    """In-memory view of token.txt (``access-token=`` / ``refresh-token=`` lines).
+
+    Reads are served from memory; the file is re-parsed only when its mtime or
+    size changes, and is stat()ed at most once per poll_interval. ``version``
+    increases on every reload or write so callers can tell the token changed.
+    write() replaces the file atomically (temp file in the same directory,
+    fsync, os.replace) and keeps any other lines the SSO program put there.
+    """
+
+    def __init__(self, path: Optional[str] = None, poll_interval: float = TOKEN_FILE_POLL):
+        self.path = path or default_token_path()
+        self.poll_interval = float(poll_interval)
+        self.version = 0
+        self._lock = threading.Lock()
+        self._lines = []
+        self._values = {}
+        self._stamp = None
+        self._next_poll = 0.0
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _parse(self, lines) -> dict:
+        values = {}
+        for line in lines:
+            s = line.strip()
+            if '=' in s:
+                k, v = s.split('=', 1)
+                if k in ('access-token', 'refresh-token') and k not in values:
+                    values[k] = v
+        return values
+
+    def _poll(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return
+        self._next_poll = now + self.poll_interval
+        stamp = self._stat()
+        if stamp == self._stamp:
+            return
+        lines = []
+        if stamp is not None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        self._lines = lines
+        self._values = self._parse(lines)
+        self._stamp = stamp
+        self.version += 1
+
+    def get(self, key: str, force: bool = False) -> Optional[str]:
+        with self._lock:
+            self._poll(force)
+            return self._values.get(key)
+
+    def access_token(self, force: bool = False) -> Optional[str]:
+        return self.get('access-token', force)
+
+    def refresh_token(self, force: bool = False) -> Optional[str]:
+        return self.get('refresh-token', force)
+
+    def write(self, access: Optional[str] = None, refresh: Optional[str] = None) -> None:
+        """Replace the access/refresh lines given (None keeps the current value) atomically."""
+        with self._lock:
+            self._poll(force=True)
+            updates = {}
+            if access is not None:
+                updates['access-token'] = access
+            if refresh is not None:
+                updates['refresh-token'] = refresh
+            out = []
+            for line in self._lines:
+                key = line.strip().split('=', 1)[0]
+                if key in updates:
+                    out.append(f"{key}={updates.pop(key)}")
+                else:
+                    out.append(line)
+            for key in ('access-token', 'refresh-token'):
+                if key in updates:
+                    out.append(f"{key}={updates.pop(key)}")
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix='.token.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write("\n".join(out) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            except Exception:
+                try:
+                    os.remove(tmp)
+                except OSError as e:
+                    print(f"[TOKEN] could not remove temp file {tmp}: {e}")
+                raise
+            self._lines = out
+            self._values = self._parse(out)
+            self._stamp = self._stat()
+            self._next_poll = time.monotonic() + self.poll_interval
+            self.version += 1
+
+
+token_file = TokenFile()
 
 
 def read_token() -> str:
-    token_file = os.path.join(os.environ['USERPROFILE'], 'SRM Smart Card Single Sign-On', 'token.txt')
-    with open(token_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith('access-token='):
-                return line.split('=', 1)[1]
+    token = token_file.access_token()
+    if token:
+        return token
+    if not os.path.exists(token_file.path):
+        raise FileNotFoundError(token_file.path)
     raise ValueError('ไม่พบ access-token ในไฟล์ token.txt')
 
 
@@ -33,19 +354,29 @@ def ensure_srm_check_table(conn) -> None:
                 subinscl_name VARCHAR(255) NULL,
                 card_id VARCHAR(255) NULL,
                 death_date DATE NULL,
-                status VARCHAR(255) NULL
+                status VARCHAR(255) NULL,
+                KEY idx_srm_check_check_date (check_date)
             ) CHARACTER SET tis620 COLLATE tis620_thai_ci
             """
         )
     conn.commit()
 
 
+def day_range_sql(column: str, day_sql: str = "CURDATE()") -> str:
+    """Half-open predicate matching one calendar day of column, so an index on column stays usable.
+
+    day_sql is an SQL date expression; when it holds a placeholder (e.g. "%s")
+    the caller must bind the date twice.
+    """
+    return f"{column} >= {day_sql} AND {column} < {day_sql} + INTERVAL 1 DAY"
+
+
 def was_checked_today(conn, cid: str) -> bool:
     with conn.cursor() as cur:
         cur.execute(
-            """
+            f"""
             SELECT 1 FROM srm_check
-            WHERE cid = %s AND DATE(check_date) = CURDATE()
+            WHERE cid = %s AND {day_range_sql("check_date")}
             LIMIT 1
             """,
             (cid,)
@@ -54,19 +385,133 @@ def was_checked_today(conn, cid: str) -> bool:
         return bool(row)
 
 
-def _has_hosxp_death_flag(conn) -> bool:
-    try:
+# Schema capability cache: (host, port, database) -> {table: set(columns)}
+SCHEMA_PROBE_TABLES = ("patient", "person", "ovst", "visit")
+
+_schema_lock = threading.Lock()
+_schema_cache = {}
+
+
+def _schema_key(conn) -> tuple:
+    db = getattr(conn, "db", None)
+    if isinstance(db, (bytes, bytearray)):
+        db = bytes(db).decode("utf-8", "ignore")
+    return (str(getattr(conn, "host", "") or ""), int(getattr(conn, "port", 0) or 0), str(db or ""))
+
+
+def probe_schema(conn, tables=SCHEMA_PROBE_TABLES, force: bool = False) -> dict:
+    """Load the column sets of tables for this connection target with one information_schema query.
+
+    Tables already cached are skipped unless force is set; a table that does
+    not exist is cached as an empty column set.
+    """
+    key = _schema_key(conn)
+    tables = [str(t).lower() for t in tables]
+    with _schema_lock:
+        entry = _schema_cache.setdefault(key, {})
+        todo = [t for t in tables if force or t not in entry]
+    if todo:
+        found = {t: set() for t in todo}
+        placeholders = ",".join(["%s"] * len(todo))
         with conn.cursor() as cur:
             cur.execute(
-                """
-                SELECT 1 FROM information_schema.COLUMNS
-                WHERE TABLE_SCHEMA = DATABASE()
-                  AND TABLE_NAME = 'patient'
-                  AND COLUMN_NAME = 'death'
-                LIMIT 1
-                """
+                f"""
+                SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})
+                """,
+                todo,
             )
-            return bool(cur.fetchone())
+            for tname, cname in cur.fetchall() or []:
+                if isinstance(tname, (bytes, bytearray)):
+                    tname = bytes(tname).decode("utf-8", "ignore")
+                if isinstance(cname, (bytes, bytearray)):
+                    cname = bytes(cname).decode("utf-8", "ignore")
+                found.setdefault(str(tname).lower(), set()).add(str(cname).lower())
+        with _schema_lock:
+            entry = _schema_cache.setdefault(key, {})
+            entry.update(found)
+    with _schema_lock:
+        return {t: set(cols) for t, cols in _schema_cache.get(key, {}).items()}
+
+
+def column_exists(conn, table: str, column: str) -> bool:
+    """Cached check for table.column on the connection's target; probes the table once."""
+    key = _schema_key(conn)
+    table = str(table).lower()
+    with _schema_lock:
+        cols = _schema_cache.get(key, {}).get(table)
+    if cols is None:
+        cols = probe_schema(conn, (table,)).get(table, set())
+    return str(column).lower() in cols
+
+
+def invalidate_schema_cache(conn=None) -> None:
+    """Forget cached schema for conn's target, or for every target when conn is None."""
+    with _schema_lock:
+        if conn is None:
+            _schema_cache.clear()
+        else:
+            _schema_cache.pop(_schema_key(conn), None)
+
+
+# Indexes the rights sweep relies on: (system or None for any, table, column, index name)
+SUPPORTING_INDEXES = (
+    (None, "srm_check", "check_date", "idx_srm_check_check_date"),
+    ("hosxp", "ovst", "vstdate", "idx_ovst_vstdate"),
+    ("hosxp", "ovst", "hn", "idx_ovst_hn"),
+    ("hosxp", "patient", "cid", "idx_patient_cid"),
+    ("hosxp", "person", "cid", "idx_person_cid"),
+    ("hosxp", "patient", "last_update", "idx_patient_last_update"),
+    ("jhcis", "person", "idcard", "idx_person_idcard"),
+    ("jhcis", "visit", "visitdate", "idx_visit_visitdate"),
+    ("jhcis", "person", "dateupdate", "idx_person_dateupdate"),
+)
+
+
+def missing_indexes(conn, system: str) -> list:
+    """Return (table, column, index_name) for supporting indexes no existing index leads with.
+
+    Tables or columns absent from this HIS are ignored.
+    """
+    system = str(system or "").strip().lower()
+    wanted = [
+        (t, c, name) for sys_name, t, c, name in SUPPORTING_INDEXES
+        if (sys_name is None or sys_name == system) and column_exists(conn, t, c)
+    ]
+    if not wanted:
+        return []
+    tables = sorted({t for t, _, _ in wanted})
+    placeholders = ",".join(["%s"] * len(tables))
+    leading = set()
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND SEQ_IN_INDEX = 1 AND TABLE_NAME IN ({placeholders})
+            """,
+            tables,
+        )
+        for tname, cname in cur.fetchall() or []:
+            if isinstance(tname, (bytes, bytearray)):
+                tname = bytes(tname).decode("utf-8", "ignore")
+            if isinstance(cname, (bytes, bytearray)):
+                cname = bytes(cname).decode("utf-8", "ignore")
+            leading.add((str(tname).lower(), str(cname).lower()))
+    return [(t, c, name) for t, c, name in wanted if (t, c) not in leading]
+
+
+def create_index(conn, table: str, column: str, index_name: str) -> None:
+    """Create a single-column index; names come from SUPPORTING_INDEXES, never from user input."""
+    with conn.cursor() as cur:
+        sql = f"CREATE INDEX `{index_name}` ON `{table}` (`{column}`)"
+        print(f"[SQL INDEX] {sql}")
+        cur.execute(sql)
+    conn.commit()
+
+
+def _has_hosxp_death_flag(conn) -> bool:
+    try:
+        return column_exists(conn, "patient", "death")
     except Exception as e:
         traceback.print_exc()
         return False
@@ -89,16 +534,7 @@ def is_patient_dead(conn, cid: str) -> bool:
         else:
             # JHCIS: check person.dischargetype (9 = dead)
             try:
-                cur.execute(
-                    """
-                    SELECT 1 FROM information_schema.COLUMNS
-                    WHERE TABLE_SCHEMA = DATABASE()
-                      AND TABLE_NAME = 'person'
-                      AND COLUMN_NAME = 'dischargetype'
-                    LIMIT 1
-                    """
-                )
-                if not cur.fetchone():
+                if not column_exists(conn, "person", "dischargetype"):
                     return False
                 cur.execute(
                     """
@@ -119,6 +555,145 @@ def is_patient_dead(conn, cid: str) -> bool:
                 return False
 
 
+def cid_range_sql(column: str) -> str:
+    """Index-friendly CID shape check: a range scan on column plus its length.
+
+    The range starts at '0000000000000' so CIDs with a leading 0 are kept, as
+    with the former REGEXP '^[0-9]{13}$'. Values starting with a non-digit fall
+    outside the range; the remaining all-digit check is left to is_valid_cid so
+    no REGEXP runs per row.
+    """
+    return f"{column} BETWEEN '0000000000000' AND '9999999999999' AND CHAR_LENGTH({column}) = 13"
+
+
+def is_valid_cid(cid) -> bool:
+    cid = "" if cid is None else str(cid)
+    return len(cid) == 13 and cid.isascii() and cid.isdigit()
+
+
+def patient_list_query(conn, system: str, since=None) -> tuple:
+    """(sql, params) for the patient roster: living HOSxP patients / JHCIS persons not discharged.
+
+    With since set, only rows whose last_update (HOSxP) / dateupdate (JHCIS) is at or
+    after it are returned, plus a trailing listable flag so the caller can drop
+    rows that became dead or discharged.
+    """
+    # CID validation: an index-range on cid plus CHAR_LENGTH; the all-digit check runs in Python
+    delta = since is not None
+    params = (since,) if delta else ()
+    if str(system or "").lower() == "jhcis":
+        listable = "(p.dischargedate IS NULL OR p.dischargedate = '0000-00-00')"
+        return (
+            f"""
+            SELECT 
+                p.idcard          AS cid,
+                t.titlename       AS pname,
+                p.fname           AS fname,
+                p.lname           AS lname,
+                p.rightcode       AS pttype,
+                p.rightno         AS pttype_no,
+                p.dateupdate      AS last_update_right
+                {f", {listable} AS listable" if delta else ""}
+            FROM person p
+            LEFT JOIN ctitle t ON p.prename = t.titlecode
+            WHERE {cid_range_sql("p.idcard")}
+              {"AND p.dateupdate >= %s" if delta else f"AND {listable}"}
+            """,
+            params,
+        )
+    # Dead patients are excluded server-side in the same scan
+    listable = ""
+    try:
+        if _has_hosxp_death_flag(conn):
+            listable = "COALESCE(death, 'N') <> 'Y'"
+    except Exception as e:
+        traceback.print_exc()
+    if delta:
+        return (
+            f"""
+            SELECT cid, pname, fname, lname, pttype, pttype_no, last_update,
+                   {listable or "1"} AS listable
+            FROM patient
+            WHERE {cid_range_sql("cid")}
+              AND last_update >= %s
+            """,
+            params,
+        )
+    return (
+        f"""
+        SELECT cid, pname, fname, lname, pttype, pttype_no, last_update
+        FROM patient
+        WHERE {cid_range_sql("cid")}
+          {"AND " + listable if listable else ""}
+        """,
+        params,
+    )
+
+
+def load_visit_cids(conn, system: str, visit_date: Optional[str] = None) -> list:
+    """Distinct valid CIDs with a visit on visit_date (YYYY-MM-DD, default today), in visit order."""
+    day_sql = "DATE(%s)" if visit_date else "CURDATE()"
+    with conn.cursor() as cur:
+        if str(system or "").lower() == "jhcis":
+            cur.execute(
+                f"""
+                SELECT p.idcard FROM visit v JOIN person p ON p.pid = v.pid
+                WHERE v.visitdate = {day_sql}
+                ORDER BY v.visitno
+                """,
+                (visit_date,) if visit_date else (),
+            )
+        else:
+            cur.execute(
+                f"""
+                SELECT p.cid FROM ovst o JOIN patient p ON p.hn = o.hn
+                WHERE {day_range_sql("o.vstdate", day_sql)}
+                ORDER BY o.vn
+                """,
+                (visit_date, visit_date) if visit_date else (),
+            )
+        seen = set()
+        cids = []
+        for r in cur.fetchall() or []:
+            cid = str(r[0]) if r and r[0] is not None else ""
+            if is_valid_cid(cid) and cid not in seen:
+                seen.add(cid)
+                cids.append(cid)
+        return cids
+
+
+def load_checked_cids(conn, check_date: Optional[str] = None) -> set:
+    """Return every CID with an srm_check row on check_date (YYYY-MM-DD, default today) in one query."""
+    with conn.cursor() as cur:
+        if check_date:
+            cur.execute(f"SELECT cid FROM srm_check WHERE {day_range_sql('check_date', 'DATE(%s)')}", (check_date, check_date))
+        else:
+            cur.execute(f"SELECT cid FROM srm_check WHERE {day_range_sql('check_date')}")
+        return {str(r[0]) for r in (cur.fetchall() or []) if r and r[0]}
+
+
+def load_dead_cids(conn) -> set:
+    """Return every CID that is_patient_dead would report as dead, using one set-based query."""
+    try:
+        with conn.cursor() as cur:
+            if _has_hosxp_death_flag(conn):
+                cur.execute("SELECT cid FROM patient WHERE death IN ('Y', 'y')")
+            else:
+                # JHCIS: same dischargetype rule as is_patient_dead
+                if not column_exists(conn, "person", "dischargetype"):
+                    return set()
+                cur.execute(
+                    """
+                    SELECT idcard FROM person
+                    WHERE dischargetype IS NOT NULL AND TRIM(dischargetype) <> '9'
+                    """
+                )
+            return {str(r[0]) for r in (cur.fetchall() or []) if r and r[0]}
+    except Exception as e:
+        traceback.print_exc()
+        return set()
+
+
 def _normalize_check_date(check_date: Optional[str]) -> Optional[str]:
     if isinstance(check_date, str) and check_date:
         try:
@@ -148,7 +723,7 @@ def _normalize_death_date(death_date: Optional[str]) -> Optional[str]:
     return None
 
 
-def upsert_srm_check(conn, cid: str, check_date: Optional[str], death_date: Optional[str], funds: list, status: Optional[int] = None) -> None:
+def _srm_check_row(cid: str, check_date: Optional[str], death_date: Optional[str], funds: list, status: Optional[int] = None) -> tuple:
     norm_dt = _normalize_check_date(check_date)
     norm_death = _normalize_death_date(death_date)
     fund_text = json.dumps(funds or [], ensure_ascii=False)
@@ -171,17 +746,238 @@ def upsert_srm_check(conn, cid: str, check_date: Optional[str], death_date: Opti
     except Exception as e:
         traceback.print_exc()
         maininscl_id = maininscl_name = subinscl_id = subinscl_name = card_id = None
+    return (cid, norm_dt, fund_text, maininscl_id, maininscl_name, subinscl_id, subinscl_name, card_id, norm_death, None if status is None else str(status))
+
+
+SRM_CHECK_COLUMNS = ("cid", "check_date", "fund", "maininscl", "maininscl_name", "subinscl", "subinscl_name", "card_id", "death_date", "status")
+
+
+def upsert_srm_check(conn, cid: str, check_date: Optional[str], death_date: Optional[str], funds: list, status: Optional[int] = None) -> None:
     with conn.cursor() as cur:
         cur.execute(
             """
             REPLACE INTO srm_check (cid, check_date, fund, maininscl, maininscl_name, subinscl, subinscl_name, card_id, death_date, status)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """,
-            (cid, norm_dt, fund_text, maininscl_id, maininscl_name, subinscl_id, subinscl_name, card_id, norm_death, None if status is None else str(status))
+            _srm_check_row(cid, check_date, death_date, funds, status)
         )
     conn.commit()
 
 
+# Write-behind defaults for SrmCheckWriter
+SRM_CHECK_FLUSH_ROWS = 200
+SRM_CHECK_FLUSH_SECONDS = 5.0
+
+
+class SrmCheckWriter:
+    """Write-behind buffer for srm_check.
+
+    Results are collected in memory and written as one multi-row
+    INSERT ... ON DUPLICATE KEY UPDATE (one commit) every flush_rows rows or
+    flush_seconds seconds. Callers must flush() when the sweep ends.
+
+    before_flush (e.g. RightsUpdateWriter.flush) runs before every write, so a
+    CID is never in srm_check while the HIS update queued ahead of it is still
+    pending; if it raises, nothing is written.
+    """
+
+    def __init__(self, conn, flush_rows: int = SRM_CHECK_FLUSH_ROWS, flush_seconds: float = SRM_CHECK_FLUSH_SECONDS,
+                 before_flush: Optional[Callable[[], object]] = None):
+        self._conn = conn
+        self._before_flush = before_flush
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_seconds = float(flush_seconds)
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self.written = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, cid: str, check_date: Optional[str], death_date: Optional[str], funds: list, status: Optional[int] = None) -> None:
+        self._rows.append(_srm_check_row(cid, check_date, death_date, funds, status))
+        self.maybe_flush()
+
+    def maybe_flush(self) -> None:
+        if len(self._rows) >= self.flush_rows or (self._rows and time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+
+    def flush(self) -> int:
+        """Write all buffered rows; returns the number of rows written."""
+        rows = self._rows
+        self._last_flush = time.monotonic()
+        if not rows:
+            return 0
+        if self._before_flush is not None:
+            self._before_flush()
+        cols = ", ".join(SRM_CHECK_COLUMNS)
+        row_sql = "(" + ", ".join(["%s"] * len(SRM_CHECK_COLUMNS)) + ")"
+        updates = ", ".join(f"{c}=VALUES({c})" for c in SRM_CHECK_COLUMNS[1:])
+        sql = f"INSERT INTO srm_check ({cols}) VALUES " + ", ".join([row_sql] * len(rows)) + f" ON DUPLICATE KEY UPDATE {updates}"
+        params = [v for r in rows for v in r]
+        with self._conn.cursor() as cur:
+            cur.execute(sql, params)
+        self._conn.commit()
+        self._rows = []
+        self.written += len(rows)
+        return len(rows)
+
+
+# Number of CIDs written per batched HIS rights update (one transaction each)
+RIGHTS_UPDATE_CHUNK = 100
+
+
+def _case_sql(key_col: str, keys: list, values: list, value_sql: str = "%s") -> tuple:
+    """Build "CASE key_col WHEN %s THEN <value_sql> ... END" and its params."""
+    parts = []
+    params = []
+    for k, v in zip(keys, values):
+        parts.append(f"WHEN %s THEN {value_sql}")
+        params.extend([k, v])
+    return f"CASE {key_col} " + " ".join(parts) + " END", params
+
+
+def _run_update(cur, sets: list, where_sql: str, where_params: list) -> int:
+    sql_parts = []
+    params = []
+    for col, (expr, expr_params) in sets:
+        sql_parts.append(f"{col}={expr}")
+        params.extend(expr_params)
+    sql = where_sql.format(sets=", ".join(sql_parts))
+    cur.execute(sql, params + where_params)
+    return cur.rowcount
+
+
+def _coalesce(case_sql: tuple, current_col: str) -> tuple:
+    expr, params = case_sql
+    return f"COALESCE({expr}, {current_col})", params
+
+
+def apply_rights_updates(conn, system: str, updates: list, visit_date: Optional[str] = None) -> dict:
+    """Write a chunk of rights changes to the HIS in one transaction.
+
+    updates is a list of dicts with cid, pttype, pttype_no, hospmain, hospsub,
+    begin_date, expire_date, main_inscl_name and sub_inscl_name. Each table is
+    updated with a single CASE-based UPDATE covering the whole chunk; today's
+    (or visit_date's) visits are updated the same way. Returns affected rows
+    per table.
+    """
+    system = (system or "").strip().lower()
+    # Last update wins when a CID appears twice in the chunk
+    by_cid = {}
+    for u in updates or []:
+        if u.get("cid"):
+            by_cid[str(u["cid"])] = u
+    if not by_cid or system not in ("hosxp", "jhcis"):
+        return {}
+    cids = list(by_cid.keys())
+    rows = list(by_cid.values())
+
+    def col(key, blank_as_none=True):
+        vals = [r.get(key) for r in rows]
+        return [(v or None) for v in vals] if blank_as_none else vals
+
+    in_sql = ",".join(["%s"] * len(cids))
+    date_sql = "DATE(%s)" if visit_date else "CURDATE()"
+    date_params = [visit_date] if visit_date else []
+    affected = {}
+    try:
+        with conn.cursor() as cur:
+            if system == "hosxp":
+                affected["person"] = _run_update(cur, [
+                    ("pttype", _case_sql("cid", cids, col("pttype"))),
+                    ("pttype_begin_date", _case_sql("cid", cids, col("begin_date"), "DATE(%s)")),
+                    ("pttype_expire_date", _case_sql("cid", cids, col("expire_date"), "DATE(%s)")),
+                    ("pttype_hospmain", _case_sql("cid", cids, col("hospmain"))),
+                    ("pttype_hospsub", _case_sql("cid", cids, col("hospsub"))),
+                    ("pttype_no", _case_sql("cid", cids, col("pttype_no"))),
+                    ("last_update_pttype", ("NOW()", [])),
+                ], f"UPDATE person SET {{sets}} WHERE cid IN ({in_sql})", cids)
+                affected["patient"] = _run_update(cur, [
+                    ("pttype", _case_sql("cid", cids, col("pttype"))),
+                    ("pttype_no", _case_sql("cid", cids, col("pttype_no"))),
+                    ("pttype_hospmain", _case_sql("cid", cids, col("hospmain"))),
+                    ("pttype_hospsub", _case_sql("cid", cids, col("hospsub"))),
+                    ("last_update", ("NOW()", [])),
+                ], f"UPDATE patient SET {{sets}} WHERE cid IN ({in_sql})", cids)
+                affected["ovst"] = _run_update(cur, [
+                    ("o.pttype", _case_sql("p.cid", cids, col("pttype"))),
+                    ("o.pttypeno", _case_sql("p.cid", cids, col("pttype_no"))),
+                    ("o.hospmain", _case_sql("p.cid", cids, col("hospmain"))),
+                    ("o.hospsub", _case_sql("p.cid", cids, col("hospsub"))),
+                ], f"UPDATE ovst o JOIN patient p ON p.hn = o.hn SET {{sets}} WHERE {day_range_sql('o.vstdate', date_sql)} AND p.cid IN ({in_sql})", date_params * 2 + cids)
+            else:
+                # JHCIS person: only overwrite fields the API returned (NULL keeps the current value)
+                hm = [r.get("hospmain") for r in rows]
+                hs = [r.get("hospsub") for r in rows]
+                affected["person"] = _run_update(cur, [
+                    ("rightcode", _coalesce(_case_sql("idcard", cids, col("pttype")), "rightcode")),
+                    ("rightno", _coalesce(_case_sql("idcard", cids, col("pttype_no")), "rightno")),
+                    ("hosmain", _coalesce(_case_sql("idcard", cids, hm), "hosmain")),
+                    ("hossub", _coalesce(_case_sql("idcard", cids, hs), "hossub")),
+                    ("datestart", _coalesce(_case_sql("idcard", cids, col("begin_date"), "DATE(%s)"), "datestart")),
+                    ("dateexpire", _coalesce(_case_sql("idcard", cids, col("expire_date"), "DATE(%s)"), "dateexpire")),
+                    ("dateupdate", ("NOW()", [])),
+                ], f"UPDATE person SET {{sets}} WHERE idcard IN ({in_sql})", cids)
+                affected["visit"] = _run_update(cur, [
+                    ("v.rightcode", _case_sql("p.idcard", cids, col("pttype"))),
+                    ("v.rightno", _case_sql("p.idcard", cids, col("pttype_no"))),
+                    ("v.hosmain", _case_sql("p.idcard", cids, col("hospmain"))),
+                    ("v.hossub", _case_sql("p.idcard", cids, col("hospsub"))),
+                    ("v.main_inscl", _case_sql("p.idcard", cids, col("main_inscl_name"))),
+                    ("v.sub_inscl", _case_sql("p.idcard", cids, col("sub_inscl_name"))),
+                    ("v.dateupdate", ("NOW()", [])),
+                ], f"UPDATE visit v JOIN person p ON p.pid = v.pid SET {{sets}} WHERE v.visitdate={date_sql} AND p.idcard IN ({in_sql})", date_params + cids)
+        conn.commit()
+    except Exception as e:
+        traceback.print_exc()
+        try:
+            conn.rollback()
+        except Exception as e2:
+            traceback.print_exc()
+        raise
+    print(f"[SQL BATCH UPDATE] system={system} cids={len(cids)} affected={affected}")
+    return affected
+
+
+class RightsUpdateWriter:
+    """Collects rights changes and applies them with apply_rights_updates every chunk_size CIDs."""
+
+    def __init__(self, conn, system: str, visit_date: Optional[str] = None, chunk_size: int = RIGHTS_UPDATE_CHUNK):
+        self._conn = conn
+        self._system = system
+        self._visit_date = visit_date
+        self.chunk_size = max(1, int(chunk_size))
+        self._updates = []
+
+    def __len__(self) -> int:
+        return len(self._updates)
+
+    def add(self, cid: str, pttype=None, pttype_no=None, hospmain=None, hospsub=None, begin_date=None, expire_date=None, main_inscl_name=None, sub_inscl_name=None) -> None:
+        self._updates.append({
+            "cid": cid,
+            "pttype": pttype,
+            "pttype_no": pttype_no,
+            "hospmain": hospmain,
+            "hospsub": hospsub,
+            "begin_date": begin_date,
+            "expire_date": expire_date,
+            "main_inscl_name": main_inscl_name,
+            "sub_inscl_name": sub_inscl_name,
+        })
+        if len(self._updates) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> dict:
+        # Kept queued if the transaction fails, so srm_check (see before_flush) does not run ahead of it
+        updates = self._updates
+        if not updates:
+            return {}
+        result = apply_rights_updates(self._conn, self._system, updates, self._visit_date)
+        self._updates = []
+        return result
+
+
 def update_patient_death(conn, cid: str) -> None:
     # Only update for HOSxP schema with patient.death flag
     if not _has_hosxp_death_flag(conn):
@@ -199,19 +995,295 @@ def update_patient_death(conn, cid: str) -> None:
 def call_right_search(token: str, cid: str) -> requests.Response:
     headers = { 'Authorization': f'Bearer {token}' }
     url = f"https://srm.nhso.go.th/api/ucws/v1/right-search?pid={cid}"
-    return requests.get(url, headers=headers)
+    rate_limiter.acquire()
+    _count_http("requests")
+    resp = get_http_session().get(url, headers=headers, timeout=_http_timeout())
+    if resp.status_code in SRM_THROTTLE_STATUSES:
+        rate_limiter.on_throttle(_parse_retry_after(resp.headers.get("Retry-After")))
+    else:
+        rate_limiter.on_success()
+    return resp
 
 
-def refresh_token():
-    token_file = os.path.join(os.environ['USERPROFILE'], 'SRM Smart Card Single Sign-On', 'token.txt')
-    # Read existing refresh-token from file
-    refresh_tok = None
-    with open(token_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith('refresh-token='):
-                refresh_tok = line.split('=', 1)[1]
+# Response cache TTLs (seconds): roster sweeps reuse recent answers, single checks always call
+SRM_CACHE_TTL_SWEEP = 24 * 3600
+SRM_CACHE_TTL_SINGLE = 0
+# Upper bound on cached bodies (a few KB each)
+SRM_CACHE_MAX_ENTRIES = 50000
+
+
+class CachedRightsResponse:
+    """Minimal stand-in for requests.Response built from a cached right-search body."""
+
+    status_code = 200
+    ok = True
+    from_cache = True
+
+    def __init__(self, body: dict):
+        self._body = body
+        self.headers = {}
+
+    def json(self):
+        return self._body
+
+    @property
+    def text(self) -> str:
+        return json.dumps(self._body, ensure_ascii=False)
+
+
+class RightsResponseCache:
+    """Process-wide cache of successful right-search bodies keyed by CID.
+
+    Entries are added after every 200 response and can be preloaded from
+    srm_check, so a CID answered in one window is not fetched again by another
+    within the caller's TTL. Each entry expires after the TTL it was stored
+    with; expired entries are dropped as they are met on get and put, and at
+    most max_entries are kept (least recently used go first). Each lookup
+    counts as a hit or a miss.
+    """
+
+    def __init__(self, max_entries: int = SRM_CACHE_MAX_ENTRIES):
+        self._lock = threading.Lock()
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()  # cid -> (fetched_at, expires_at, body), least recently used first
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    def _prune(self, now: float) -> None:
+        # Caller holds self._lock; expired entries gather at the old end, the cap trims the rest
+        while self._entries:
+            cid, entry = next(iter(self._entries.items()))
+            if entry[1] > now and len(self._entries) <= self.max_entries:
                 break
+            del self._entries[cid]
+            self._stats["evicted"] += 1
+
+    def get(self, cid: str, ttl: float):
+        """Return a CachedRightsResponse younger than ttl seconds, or None (ttl <= 0 never hits)."""
+        cid = str(cid)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cid) if ttl and ttl > 0 else None
+            if entry is not None and entry[1] <= now:
+                del self._entries[cid]
+                self._stats["evicted"] += 1
+                entry = None
+            if entry is not None and now - entry[0] <= ttl:
+                self._entries.move_to_end(cid)
+                self._stats["hits"] += 1
+                return CachedRightsResponse(entry[2])
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, cid: str, body: dict, ttl: float, fetched_at: Optional[float] = None) -> None:
+        """Store body for ttl seconds from fetched_at; ttl <= 0 stores nothing."""
+        if not isinstance(body, dict) or not ttl or ttl <= 0:
+            return
+        fetched_at = fetched_at or time.time()
+        now = time.time()
+        if fetched_at + ttl <= now:
+            return
+        cid = str(cid)
+        with self._lock:
+            self._entries[cid] = (fetched_at, fetched_at + ttl, body)
+            self._entries.move_to_end(cid)
+            self._stats["stored"] += 1
+            self._prune(now)
+
+    def preload(self, conn, ttl: float) -> int:
+        """Load the newest srm_check rows checked within ttl seconds (up to max_entries); returns how many were cached."""
+        if not ttl or ttl <= 0:
+            return 0
+        now = time.time()
+        loaded = []
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT cid, check_date, fund, death_date, TIMESTAMPDIFF(SECOND, check_date, NOW())
+                FROM srm_check
+                WHERE check_date >= NOW() - INTERVAL %s SECOND AND status = '200'
+                ORDER BY check_date DESC
+                LIMIT %s
+                """,
+                (int(ttl), self.max_entries),
+            )
+            for cid, check_date, fund, death_date, age in cur.fetchall() or []:
+                try:
+                    funds = json.loads(fund) if fund else []
+                except Exception as e:
+                    print(f"[CACHE] CID={cid} unreadable srm_check.fund skipped: {e}")
+                    continue
+                body = {
+                    "checkDate": check_date.strftime("%Y-%m-%dT%H:%M:%S") if isinstance(check_date, datetime) else check_date,
+                    "pid": str(cid),
+                    "funds": funds,
+                }
+                if death_date:
+                    body["deathDate"] = str(death_date)
+                loaded.append((str(cid), now - max(0, int(age or 0)), body))
+        with self._lock:
+            # Oldest first, so the newest checks end up most recently used
+            for cid, fetched_at, body in reversed(loaded):
+                current = self._entries.get(cid)
+                if current is None or current[0] < fetched_at:
+                    self._entries[cid] = (fetched_at, fetched_at + ttl, body)
+                    self._entries.move_to_end(cid)
+            self._prune(now)
+        return len(loaded)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+
+response_cache = RightsResponseCache()
+
+
+def cache_ttl_from_settings(settings, use: str = "sweep") -> float:
+    """TTL for a use case ("sweep" or "single") from QSettings srm_cache_ttl_<use>."""
+    default = SRM_CACHE_TTL_SWEEP if use == "sweep" else SRM_CACHE_TTL_SINGLE
+    try:
+        return max(0.0, float(settings.value(f"srm_cache_ttl_{use}", default)))
+    except Exception as e:
+        traceback.print_exc()
+        return float(default)
+
+
+def cached_right_search(token: str, cid: str, ttl: float = SRM_CACHE_TTL_SINGLE):
+    """call_right_search through response_cache: serve a body younger than ttl, store every 200 for ttl."""
+    cached = response_cache.get(cid, ttl)
+    if cached is not None:
+        return cached
+    resp = call_right_search(token, cid)
+    if resp.status_code == 200:
+        try:
+            response_cache.put(cid, resp.json(), ttl)
+        except Exception as e:
+            traceback.print_exc()
+    return resp
+
+
+# Default number of right-search requests kept in flight by right_search_pipeline
+RIGHTS_MAX_IN_FLIGHT = 4
+# How many more times a throttled / failed CID is retried before it counts as failed
+RIGHTS_MAX_RETRIES = 2
+# Base delay before resubmitting a throttled/failed CID; doubles per attempt
+RIGHTS_RETRY_BACKOFF = 0.5
+
+
+def _should_retry(resp, error) -> bool:
+    if error is not None:
+        return True
+    return resp is not None and resp.status_code in SRM_THROTTLE_STATUSES
+
+
+def _delayed_right_search(cancelled: threading.Event, delay: float, token, cid, ttl: float):
+    if cancelled.wait(delay):
+        raise RuntimeError("right-search cancelled")
+    return cached_right_search(token, cid, ttl)
+
+
+def right_search_pipeline(token, jobs, max_in_flight: int = RIGHTS_MAX_IN_FLIGHT, should_stop=None, max_retries: int = RIGHTS_MAX_RETRIES, cache_ttl: float = 0, on_unauthorized=None):
+    """Run cached_right_search for many CIDs with up to max_in_flight requests running.
+
+    jobs yields (key, cid, call) tuples; when call is False the job is passed
+    through without calling the API. Results are yielded as (key, cid, resp, error)
+    in the same order as jobs, so callers can update rows one after another.
+    jobs is consumed lazily on the caller's thread (safe for DB lookups there).
+
+    Throttled (429/5xx) or errored CIDs are resubmitted in place, after a short
+    backoff, up to max_retries more attempts; only then is the last response or
+    error yielded, so a later CID is never yielded before an earlier one. When
+    should_stop() turns true no new jobs are started and the generator returns
+    at the first unfinished result: every key before that point has been
+    yielded and none after it, so callers resume from the last key they saw.
+    Bodies younger than cache_ttl seconds come from response_cache instead of
+    the API.
+
+    token may be a string or a callable returning the current token (e.g.
+    token_manager.get). With on_unauthorized set (e.g. token_manager.refresh),
+    a 401 calls it with the token that failed and resubmits the CID once with
+    the new token; the 401 is yielded only when no new token is available.
+    """
+    get_token = token if callable(token) else (lambda: token)
+    max_in_flight = max(1, int(max_in_flight or 1))
+    executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="srm-right-search")
+    cancelled = threading.Event()
+    pending = deque()
+    job_iter = iter(jobs)
+    exhausted = False
+
+    def stopping() -> bool:
+        return should_stop is not None and should_stop()
+
+    try:
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                if stopping():
+                    exhausted = True
+                    break
+                job = next(job_iter, None)
+                if job is None:
+                    exhausted = True
+                    break
+                key, cid, call = job
+                used = get_token() if call else None
+                fut = executor.submit(cached_right_search, used, cid, cache_ttl) if call else None
+                pending.append((key, cid, 0, False, used, fut))
+            if not pending:
+                return
+            key, cid, attempt, reauthed, used, fut = pending[0]
+            if fut is None:
+                pending.popleft()
+                yield key, cid, None, None
+                continue
+            resp = None
+            error = None
+            try:
+                # Poll so a stop request is seen while the head CID is backing off
+                while True:
+                    try:
+                        resp = fut.result(timeout=0.5)
+                        break
+                    except FutureTimeoutError:
+                        if stopping():
+                            return
+            except Exception as e:
+                traceback.print_exc()
+                error = e
+            pending.popleft()
+            if resp is not None and resp.status_code == 401 and on_unauthorized is not None and not reauthed:
+                if on_unauthorized(used):
+                    print(f"[RETRY] CID={cid} status=401 resubmitted with a refreshed token")
+                    used = get_token()
+                    fut = executor.submit(cached_right_search, used, cid, cache_ttl)
+                    pending.appendleft((key, cid, attempt, True, used, fut))
+                    continue
+            if attempt < max_retries and _should_retry(resp, error):
+                if stopping():
+                    # Not yielded, so the resume point still includes this CID
+                    return
+                reason = error if error is not None else f"status={resp.status_code}"
+                # rate_limiter already pauses for Retry-After; this only spaces out repeated failures
+                delay = min(SRM_MAX_RETRY_AFTER, RIGHTS_RETRY_BACKOFF * (2 ** attempt))
+                print(f"[RETRY] CID={cid} {reason} retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+                used = get_token()
+                fut = executor.submit(_delayed_right_search, cancelled, delay, used, cid, cache_ttl)
+                # Back at the front: later CIDs keep running but are not yielded before this one
+                pending.appendleft((key, cid, attempt + 1, reauthed, used, fut))
+                continue
+            yield key, cid, resp, error
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def refresh_token():
+    # Re-read the file so a refresh-token the SSO program just wrote is used
+    refresh_tok = token_file.refresh_token(force=True)
     if not refresh_tok:
         raise ValueError("ไม่พบ refresh-token ในไฟล์")
 
@@ -220,7 +1292,8 @@ def refresh_token():
     data = {"refresh_token": refresh_tok}
 
     # Request new tokens
-    resp = requests.post(url, headers=headers, data=data)
+    _count_http("requests")
+    resp = get_http_session().post(url, headers=headers, data=data, timeout=_http_timeout())
 
     # Do not write file if error
     if not resp.ok:
@@ -266,14 +1339,130 @@ def refresh_token():
             body_text = (text or "").strip()
         raise RuntimeError(f"การขอ token ใหม่เกิดข้อผิดพลาด (no access_token in response): {body_text[:1000]}")
 
-    # Write back only normalized lines we have
-    out_lines = [access_line]
-    if refresh_line:
-        out_lines.append(refresh_line)
-    with open(token_file, 'w', encoding='utf-8') as f:
-        f.write("\n".join(out_lines) + "\n")
+    access = access_line.split('=', 1)[1]
+    # Atomic write-back; other lines in the file are kept
+    token_file.write(access=access, refresh=refresh_line.split('=', 1)[1] if refresh_line else None)
+    # Requests started from now on pick up the new token
+    token_manager.set(access)
+    return access
+
+
+# Refresh this many seconds before the access token's JWT exp
+TOKEN_REFRESH_LEAD = 300
+# Longest the auto-refresh thread sleeps before re-reading the token's expiry
+TOKEN_CHECK_INTERVAL = 60
+
+
+def jwt_expiry(token: str) -> Optional[float]:
+    """Epoch seconds from a JWT's exp claim, or None when the token is not a readable JWT."""
+    try:
+        payload = str(token).split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload.encode("ascii"))).get("exp")
+        return float(exp) if exp is not None else None
+    except Exception as e:
+        print(f"[TOKEN] cannot read exp from token: {e}")
+        return None
+
+
+class TokenManager:
+    """Holds the current SRM access token and refreshes it ahead of expiry.
+
+    get() is cheap and always returns the latest token, so requests started
+    after a refresh use the new one. refresh(stale) is deduplicated: when
+    several in-flight requests fail with the same old token only the first
+    one calls refresh_token(), the rest get the token it produced.
+    """
+
+    def __init__(self, lead_seconds: float = TOKEN_REFRESH_LEAD):
+        self.lead_seconds = float(lead_seconds)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._token = None
+        self._file_version = -1
+        self._stop = threading.Event()
+        self._thread = None
+
+    def set(self, token: str) -> None:
+        # Only a later change to token.txt overrides an explicitly set token
+        try:
+            token_file.access_token(force=True)
+        except Exception as e:
+            traceback.print_exc()
+        with self._lock:
+            self._token = token
+            self._file_version = token_file.version
+
+    def get(self) -> str:
+        """Current token; a new access-token written to token.txt (e.g. by the SSO program) replaces it."""
+        try:
+            file_token = token_file.access_token()
+        except Exception as e:
+            traceback.print_exc()
+            file_token = None
+        with self._lock:
+            if file_token and token_file.version != self._file_version:
+                self._file_version = token_file.version
+                self._token = file_token
+            if self._token:
+                return self._token
+        return read_token()
+
+    def expires_at(self) -> Optional[float]:
+        with self._lock:
+            token = self._token
+        return jwt_expiry(token) if token else None
+
+    def refresh(self, stale: Optional[str] = None) -> Optional[str]:
+        """Refresh unless another caller already replaced stale; returns the current token or None on failure."""
+        with self._refresh_lock:
+            with self._lock:
+                current = self._token
+            if stale is not None and current and current != stale:
+                return current
+            try:
+                token = refresh_token()
+            except Exception as e:
+                traceback.print_exc()
+                return None
+            with self._lock:
+                self._token = token
+            print("[TOKEN] access token refreshed")
+            return token
+
+    def start_auto_refresh(self) -> None:
+        """Start (once) a daemon thread that refreshes lead_seconds before the JWT exp."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._auto_refresh_loop, name="srm-token-refresh", daemon=True)
+            self._thread.start()
+
+    def stop_auto_refresh(self) -> None:
+        self._stop.set()
+
+    def _auto_refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            wait = TOKEN_CHECK_INTERVAL
+            try:
+                token = self.get()
+                exp = jwt_expiry(token)
+                if exp is not None:
+                    due = exp - self.lead_seconds - time.time()
+                    if due <= 0:
+                        # Success or failure, wait a full interval before the next attempt: a token
+                        # issued with less than lead_seconds left must not trigger back-to-back refreshes
+                        self.refresh(stale=token)
+                        wait = TOKEN_CHECK_INTERVAL
+                    else:
+                        wait = min(due, TOKEN_CHECK_INTERVAL)
+            except Exception as e:
+                traceback.print_exc()
+            self._stop.wait(wait)
+
 
-    return access_line.split('=', 1)[1]
+token_manager = TokenManager()
 
 
 def open_srm_program():
@@ -0,0 +1,294 @@
+"""Headless rights sweep: check SRM rights for many CIDs without the GUI.
+
+Examples:
+    python sweep.py --settings --all
+    python sweep.py --system hosxp --host 10.0.0.5 --user sa --database hos --today
+    python sweep.py --settings --cid-file cids.txt --concurrency 6 --output sweep.jsonl --resume
+
+Progress is written as JSON lines (stdout or --output). Exit codes:
+    0 all done, 1 some CIDs failed, 2 token expired, 3 setup error, 130 interrupted.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import traceback
+from datetime import datetime
+
+from RightsParser import parse_response
+from RosterCache import roster_target
+from SweepCheckpoint import SweepCheckpoint
+from srm import (
+    read_token,
+    token_manager,
+    ensure_srm_check_table,
+    probe_schema,
+    patient_list_query,
+    load_visit_cids,
+    load_checked_cids,
+    load_dead_cids,
+    is_valid_cid,
+    SrmCheckWriter,
+    RightsUpdateWriter,
+    update_patient_death,
+    right_search_pipeline,
+    response_cache,
+    configure_http,
+    http_stats,
+    RIGHTS_MAX_IN_FLIGHT,
+    SRM_CACHE_TTL_SWEEP,
+)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_TOKEN_EXPIRED = 2
+EXIT_SETUP = 3
+EXIT_INTERRUPTED = 130
+
+
+class JsonLines:
+    """Write one JSON object per line and flush, so progress can be tailed while running."""
+
+    def __init__(self, path=None):
+        # Bound to the real stdout here, before main() redirects print() to stderr
+        self._fh = open(path, "a", encoding="utf-8") if path else sys.stdout
+        self._own = bool(path)
+
+    def emit(self, event: str, **fields):
+        fields = {"event": event, "ts": datetime.now().isoformat(timespec="seconds"), **fields}
+        self._fh.write(json.dumps(fields, ensure_ascii=False, default=str) + "\n")
+        self._fh.flush()
+
+    def close(self):
+        if self._own:
+            self._fh.close()
+
+
+def _db_config_from_settings() -> dict:
+    from PyQt6.QtCore import QSettings
+
+    settings = QSettings("SRM_API", "MySQL_Settings")
+    return {
+        "system": str(settings.value("system", "jhcis")).strip().lower(),
+        "host": settings.value("host", "localhost"),
+        "port": int(settings.value("port", 3306)),
+        "user": settings.value("user", ""),
+        "password": settings.value("password", ""),
+        "database": settings.value("database", ""),
+        "timeout": int(settings.value("timeout", 10)),
+    }
+
+
+def _db_config(args) -> tuple:
+    base = _db_config_from_settings() if args.settings else {}
+    system = (args.system or base.get("system") or "jhcis").lower()
+    cfg = {
+        "host": args.host or base.get("host") or "localhost",
+        "port": int(args.port or base.get("port") or 3306),
+        "user": args.user or base.get("user") or "",
+        "password": args.password if args.password is not None else os.environ.get("SRM_DB_PASSWORD", base.get("password", "")),
+        "database": args.database or base.get("database") or "",
+        "charset": "tis620",
+        "connect_timeout": int(base.get("timeout") or 10),
+    }
+    return system, cfg
+
+
+def _read_cid_file(path: str) -> list:
+    seen = set()
+    cids = []
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line in f:
+            cid = line.strip().split(",")[0].strip()
+            if is_valid_cid(cid) and cid not in seen:
+                seen.add(cid)
+                cids.append(cid)
+    return cids
+
+
+def _load_all_cids(conn, system: str) -> list:
+    sql, params = patient_list_query(conn, system)
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return [str(r[0]) for r in cur.fetchall() or [] if is_valid_cid(r[0])]
+
+
+def run_sweep(args, out: JsonLines) -> int:
+    import pymysql
+
+    system, cfg = _db_config(args)
+    if not str(cfg["host"]).strip() or not str(cfg["database"]).strip():
+        out.emit("error", message="missing DB host/database (use --settings or --host/--database)")
+        return EXIT_SETUP
+    try:
+        token_manager.set(args.token or os.environ.get("SRM_TOKEN") or read_token())
+        token_manager.start_auto_refresh()
+    except Exception as e:
+        out.emit("error", message=f"token: {e}")
+        return EXIT_SETUP
+    try:
+        conn = pymysql.connect(**cfg)
+    except Exception as e:
+        out.emit("error", message=f"db: {e}")
+        return EXIT_SETUP
+
+    configure_http(pool_size=max(args.concurrency, 1))
+    try:
+        probe_schema(conn)
+        ensure_srm_check_table(conn)
+        if args.cid_file:
+            cids = _read_cid_file(args.cid_file)
+            source = f"file:{args.cid_file}"
+        elif args.today:
+            cids = load_visit_cids(conn, system, args.date)
+            source = f"visits:{args.date or 'today'}"
+        else:
+            cids = _load_all_cids(conn, system)
+            source = "all"
+        scope = roster_target(cfg, system) + (f"#{args.date or datetime.now().strftime('%Y-%m-%d')}" if args.today else "")
+        checkpoint = SweepCheckpoint.open(cids, scope=scope, directory=args.checkpoint_dir)
+        if not args.resume and checkpoint.done:
+            # A fresh run of the same list starts over
+            checkpoint.complete()
+            checkpoint = SweepCheckpoint.open(cids, scope=scope, directory=args.checkpoint_dir)
+        done = set(checkpoint.done)
+        checked = set() if args.force else load_checked_cids(conn, args.date if args.today else None)
+        dead = load_dead_cids(conn)
+        cache_ttl = 0 if args.force else args.cache_ttl
+        response_cache.preload(conn, cache_ttl)
+        out.emit("start", source=source, system=system, total=len(cids), resumed=len(done), concurrency=args.concurrency, checkpoint=checkpoint.path)
+
+        rights_writer = RightsUpdateWriter(conn, system, visit_date=args.date if args.today else None)
+        # Queued HIS updates are written before the srm_check rows that follow them
+        check_writer = SrmCheckWriter(conn, before_flush=rights_writer.flush)
+        counts = {"ok": 0, "skipped": 0, "failed": 0}
+        todo = [c for c in cids if c not in done]
+        started = time.monotonic()
+        expired_at = None
+        # 401s are handled inside the pipeline by refreshing through token_manager;
+        # a 401 that still comes out means the refresh itself failed
+        jobs = ((i, cid, cid not in checked) for i, cid in enumerate(todo))
+        results = right_search_pipeline(
+            token_manager.get, jobs, max_in_flight=args.concurrency, cache_ttl=cache_ttl,
+            on_unauthorized=token_manager.refresh,
+        )
+        try:
+            for i, cid, resp, error in results:
+                if resp is None and error is None:
+                    checkpoint.mark(cid)
+                    counts["skipped"] += 1
+                    out.emit("result", cid=cid, status="skipped", reason="checked_today")
+                    continue
+                if error is not None:
+                    counts["failed"] += 1
+                    out.emit("result", cid=cid, status="failed", error=str(error))
+                    continue
+                if resp.status_code == 401:
+                    expired_at = i
+                    break
+                if resp.status_code != 200:
+                    counts["failed"] += 1
+                    out.emit("result", cid=cid, status="failed", http=resp.status_code)
+                    continue
+                rec = parse_response(resp)
+                if rec.error is not None:
+                    counts["failed"] += 1
+                    out.emit("result", cid=cid, status="failed", http=200, error=rec.error)
+                    continue
+                death_date = rec.death_date
+                if args.auto_update and rec.has_rights:
+                    rights_writer.add(cid, **rec.update_kwargs())
+                check_writer.add(cid, rec.check_date, death_date, rec.funds, resp.status_code)
+                checkpoint.mark(cid)
+                # Journal only what srm_check (and so the HIS update) already holds
+                if not len(check_writer):
+                    checkpoint.commit()
+                if death_date and system == "hosxp" and args.auto_update:
+                    try:
+                        update_patient_death(conn, cid)
+                    except Exception:
+                        traceback.print_exc()
+                counts["ok"] += 1
+                out.emit(
+                    "result", cid=cid, status="ok", http=200,
+                    cached=bool(getattr(resp, "from_cache", False)),
+                    pttype=rec.pttype, pttype_no=rec.pttype_no, dead=cid in dead or bool(death_date),
+                )
+        finally:
+            results.close()
+            try:
+                # A failed rights flush raises before srm_check and the journal are written
+                rights_writer.flush()
+                check_writer.flush()
+                checkpoint.commit()
+            finally:
+                token_manager.stop_auto_refresh()
+        if expired_at is not None:
+            out.emit("token_expired", remaining=len(todo) - expired_at)
+            return EXIT_TOKEN_EXPIRED
+
+        checkpoint.complete()
+        out.emit(
+            "summary", **counts, total=len(cids), seconds=round(time.monotonic() - started, 1),
+            http=http_stats(), cache=response_cache.stats(),
+        )
+        return EXIT_FAILED if counts["failed"] else EXIT_OK
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            traceback.print_exc()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="ตรวจสอบสิทธิ SRM แบบ batch โดยไม่ต้องเปิดหน้าจอ")
+    which = p.add_mutually_exclusive_group()
+    which.add_argument("--all", action="store_true", help="ผู้ป่วยทั้งหมด (ค่าเริ่มต้น)")
+    which.add_argument("--today", action="store_true", help="ผู้มารับบริการตามวันที่ (--date หรือวันนี้)")
+    which.add_argument("--cid-file", help="ไฟล์ CID บรรทัดละ 1 รายการ")
+    p.add_argument("--date", help="วันที่รับบริการ YYYY-MM-DD ใช้กับ --today")
+    p.add_argument("--settings", action="store_true", help="อ่านการตั้งค่าฐานข้อมูลจากโปรแกรม (QSettings)")
+    p.add_argument("--system", choices=("hosxp", "jhcis"))
+    p.add_argument("--host")
+    p.add_argument("--port", type=int)
+    p.add_argument("--user")
+    p.add_argument("--password", help="หรือใช้ตัวแปร SRM_DB_PASSWORD")
+    p.add_argument("--database")
+    p.add_argument("--token", help="access token (หรือ SRM_TOKEN / token.txt)")
+    p.add_argument("--concurrency", type=int, default=RIGHTS_MAX_IN_FLIGHT)
+    p.add_argument("--cache-ttl", type=float, default=SRM_CACHE_TTL_SWEEP, help="อายุแคชผลตรวจสิทธิ (วินาที)")
+    p.add_argument("--force", action="store_true", help="ตรวจซ้ำแม้ตรวจแล้ววันนี้ และไม่ใช้แคช")
+    p.add_argument("--auto-update", action="store_true", help="อัปเดตสิทธิลง HIS")
+    p.add_argument("--output", help="ไฟล์ JSON lines (ค่าเริ่มต้น stdout)")
+    p.add_argument("--resume", action="store_true", help="ทำต่อจาก checkpoint ของรายการ CID ชุดเดิม")
+    p.add_argument("--checkpoint-dir", help="โฟลเดอร์เก็บ checkpoint (ค่าเริ่มต้น LOCALAPPDATA/SRM_API/checkpoints)")
+    return p
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.date and not args.today:
+        parser.error("--date ใช้ได้กับ --today เท่านั้น")
+    args.concurrency = max(1, args.concurrency)
+    out = JsonLines(args.output)
+    # srm's print() diagnostics would corrupt JSON lines written to stdout; send them to stderr
+    diagnostics = contextlib.redirect_stdout(sys.stderr) if not args.output else contextlib.nullcontext()
+    try:
+        with diagnostics:
+            return run_sweep(args, out)
+    except KeyboardInterrupt:
+        out.emit("interrupted")
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        traceback.print_exc()
+        out.emit("error", message=str(e))
+        return EXIT_SETUP
+    finally:
+        out.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())